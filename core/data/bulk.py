@@ -0,0 +1,144 @@
+from typing import Callable, Iterator, Optional, TextIO
+
+import gzip
+import json
+import logging
+import os
+
+from core.data.sessions import SCRYFALL_SESSION
+from core.game_concepts.card import Card
+from definitions import CACHE_DIR
+
+BULK_DATA_DIR = os.path.join(CACHE_DIR, "Bulk")
+
+CardPredicate = Callable[[dict], bool]
+
+
+def _open_bulk_file(path: str) -> TextIO:
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_bulk_json(path: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Streams the objects out of a Scryfall bulk data file, which is one large JSON array.
+    Only a chunk of the file and the object being decoded are held in memory at a time.
+    :param path: The path to the bulk file. Files ending in '.gz' are decompressed on the fly.
+    :param chunk_size: How many characters to read from the file at a time.
+    :return: Each card object in the file, in order.
+    """
+    decoder = json.JSONDecoder()
+    with _open_bulk_file(path) as f:
+        # Leading whitespace can run on past the first chunk.
+        buffer = f.read(chunk_size).lstrip()
+        while not buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer = chunk.lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"'{path}' does not contain a JSON array")
+        position = 1
+        at_eof = False
+
+        while True:
+            # Skip to the start of the next value.
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer) or at_eof:
+                    break
+                buffer, position = f.read(chunk_size), 0
+                at_eof = not buffer
+
+            if position >= len(buffer):
+                raise ValueError(f"'{path}' ended before its JSON array was closed")
+            if buffer[position] == ']':
+                return
+
+            # Decode the next value, reading more of the file until it is complete.
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buffer, position)
+                    break
+                except json.JSONDecodeError:
+                    if at_eof:
+                        raise
+                    chunk = f.read(chunk_size)
+                    at_eof = not chunk
+                    buffer, position = buffer[position:] + chunk, 0
+
+            yield obj
+            position = end
+
+
+def iter_bulk_cards(path: str, predicate: Optional[CardPredicate] = None) -> Iterator[Card]:
+    """
+    Streams cards out of a Scryfall bulk data file, only building `Card` objects for the data that matches.
+    :param path: The path to the bulk file.
+    :param predicate: A filter applied to the raw card data, before the card is built.
+    :return: Each matching card, in file order.
+    """
+    for card_data in iter_bulk_json(path):
+        if card_data.get('object') != 'card':
+            continue
+        if predicate is None or predicate(card_data):
+            yield Card(card_data)
+
+
+def in_expansions(*expansions: str) -> CardPredicate:
+    """
+    Creates a predicate that matches cards from any of the given sets.
+    :param expansions: The set codes to match, in any case.
+    :return: The predicate.
+    """
+    codes = {expansion.lower() for expansion in expansions}
+    return lambda card_data: card_data.get('set') in codes
+
+
+def download_bulk_data(kind: str = 'default_cards', output_dir: str = BULK_DATA_DIR) -> str:
+    """
+    Downloads the latest Scryfall bulk data file of a kind, unless it has already been downloaded.
+    :param kind: The type of bulk data, eg. 'default_cards' or 'oracle_cards'.
+    :param output_dir: The folder to save the file in.
+    :return: The path to the file.
+    """
+    metadata = SCRYFALL_SESSION.get(f"{SCRYFALL_SESSION.API_HOST}/bulk-data/{kind}").json()
+    file_name = os.path.basename(metadata['download_uri'])
+    path = os.path.join(output_dir, file_name)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(output_dir, exist_ok=True)
+    logging.info(f"Downloading {kind} bulk data to '{path}'")
+    with SCRYFALL_SESSION.get(metadata['download_uri'], stream=True) as response:
+        response.raise_for_status()
+        with open(f"{path}.tmp", 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+if __name__ == "__main__":
+    import sys
+    import tracemalloc
+    from time import perf_counter
+
+    # Memory benchmark: loads every card in a bulk file, with and without keeping the raw Scryfall data.
+    #  Usage: python -m core.data.bulk [path to bulk file]
+    bulk_path = sys.argv[1] if len(sys.argv) > 1 else download_bulk_data('default_cards')
+
+    for keep_json in [True, False]:
+        tracemalloc.start()
+        start = perf_counter()
+        corpus = [Card(card_data, keep_json=keep_json) for card_data in iter_bulk_json(bulk_path)
+                  if card_data.get('object') == 'card']
+        elapsed = perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"keep_json={keep_json!s:5}: {len(corpus)} cards in {elapsed:6.1f}s, "
+              f"{current / 2 ** 20:8.1f} MiB retained, {peak / 2 ** 20:8.1f} MiB peak")
+        del corpus
@@ -1,18 +1,35 @@
 from typing import Optional, Callable
-from functools import cache
 
+import asyncio
 import logging
 
-from core.data.scryfall import Scryfall
+from core.data.bulk import CardPredicate, in_expansions, iter_bulk_cards
+from core.data.query import LocalCardIndex, UnsupportedQueryError
+from core.data.scryfall import Scryfall, AsyncScryfall
+from core.data.ttl_cache import TTLCache
 from core.game_concepts.card import Card
 
 # TODO: Explain that this is SET - NAME, likely through annotations
 CardKey = tuple[str, str]
 
+# Marks a lookup that Scryfall couldn't find a card for.
+_NOT_FOUND = object()
+
 
 class CardCache:
+    DEFAULT_LOOKUP_CACHE_SIZE = 1024
+    DEFAULT_NEGATIVE_TTL = 5 * 60
+
     _card_cache: dict[str, Card]
-    on_edit: Optional[Callable[[], None]]
+    _names: dict[str, str]
+    _by_expansion: dict[str, dict[str, Card]]
+    _by_rarity: dict[str, dict[str, Card]]
+    _by_casting_identity: dict[str, dict[str, Card]]
+    _by_number: dict[tuple[str, str], Card]
+    on_edit: Optional[Callable[[Card, Optional[Card]], None]]
+    local_index: Optional[LocalCardIndex]
+    negative_ttl: float
+    _lookups: TTLCache[tuple, object]
 
     @classmethod
     def from_expansions(cls, *expansions: str):
@@ -22,23 +39,68 @@ class CardCache:
         return card_cache
 
     @classmethod
-    def from_queries(cls, *queries: str):
-        card_cache = cls()
+    def from_queries(cls, *queries: str, local_index: Optional[LocalCardIndex] = None):
+        card_cache = cls(local_index=local_index)
         for query in queries:
             card_cache.populate_cache_by_query(query)
         return card_cache
 
+    @classmethod
+    async def from_queries_async(cls, *queries: str, local_index: Optional[LocalCardIndex] = None):
+        card_cache = cls(local_index=local_index)
+        await card_cache.populate_cache_by_queries_async(*queries)
+        return card_cache
+
+    @classmethod
+    def from_bulk_file(cls, path: str, *expansions: str, predicate: Optional[CardPredicate] = None):
+        """
+        Builds a cache offline, by streaming a Scryfall bulk data file (eg. default_cards or oracle_cards).
+        :param path: The path to the bulk data file.
+        :param expansions: The sets to include cards from. If empty, all cards matching `predicate` are included.
+        :param predicate: An additional filter on the raw card data.
+        """
+        set_filter = in_expansions(*expansions) if expansions else None
+        if set_filter and predicate:
+            card_filter = lambda card_data: set_filter(card_data) and predicate(card_data)
+        else:
+            card_filter = set_filter or predicate
+
+        card_cache = cls()
+        for card in iter_bulk_cards(path, card_filter):
+            card_cache._add_to_cache(card)
+        return card_cache
+
     @classmethod
     def from_card_keys(cls, *keys: CardKey):
         card_cache = cls()
-        for key in keys:
-            query = f"(s:{key[0]} and name={key[1]})"
-            card_cache.populate_cache_by_query(query)
+        unresolved = card_cache.populate_cache_by_card_keys(*keys)
+        for key in unresolved:
+            logging.warning(f"Could not find card '{key[1]}' in set '{key[0]}'")
         return card_cache
 
-    def __init__(self, on_edit: Optional[Callable[[], None]] = None):
+    def __init__(
+            self,
+            on_edit: Optional[Callable[[Card, Optional[Card]], None]] = None,
+            local_index: Optional[LocalCardIndex] = None,
+            lookup_cache_size: int = DEFAULT_LOOKUP_CACHE_SIZE,
+            negative_ttl: float = DEFAULT_NEGATIVE_TTL
+    ):
+        """
+        :param on_edit: Called whenever a card is added to the cache, with the card and the card it replaced, if any.
+        :param local_index: A local card corpus to search, before falling back to Scryfall.
+        :param lookup_cache_size: How many results of `get_card_data` and `get_card_data_by_set` to remember.
+        :param negative_ttl: How long to remember that a lookup found no card, in seconds.
+        """
         self._card_cache = dict()
+        self._names = dict()
+        self._by_expansion = dict()
+        self._by_rarity = dict()
+        self._by_casting_identity = dict()
+        self._by_number = dict()
         self.on_edit = on_edit
+        self.local_index = local_index
+        self.negative_ttl = negative_ttl
+        self._lookups = TTLCache(lookup_cache_size)
 
     def _add_to_cache(self, card: Optional[Card], overwrite: bool = False) -> bool:
         """
@@ -48,10 +110,11 @@ class CardCache:
         :param overwrite: Whether to overwrite existing data.
         :return: Whether the value was updated.
         """
-        if not Card:
+        if not card:
             return False
 
-        if card.name in self._card_cache and not overwrite:
+        existing = self._lookup(card.full_name) or self._lookup(card.name)
+        if existing and not overwrite:
             return False
 
         # Explicitly prevent basics from being added.
@@ -59,22 +122,125 @@ class CardCache:
             return False
 
         logging.debug(f"Adding '{card.full_name}' to `CARD_CACHE`")
+        if existing and existing.full_name != card.full_name:
+            del self._card_cache[existing.full_name]
         self._card_cache[card.full_name] = card
+        self._index(card, existing)
+        # Any remembered lookup could now resolve differently, so forget them all.
+        self._lookups.clear()
         if self.on_edit:
-            self.on_edit()
+            self.on_edit(card, existing)
 
         return True
 
+    # region Indexes
+    def _index(self, card: Card, replacing: Optional[Card] = None) -> None:
+        """
+        Adds a card to the secondary indexes, in place of the card it replaces.
+        Each index keeps its cards in the order they were added, and a replacement that stays
+        in the same index entry keeps its predecessor's position, as it does in `_card_cache`.
+        :param card: The card being added.
+        :param replacing: The card it is overwriting, if any.
+        """
+        if replacing and self._names.get(replacing.name) == replacing.full_name:
+            del self._names[replacing.name]
+        self._names[card.name] = card.full_name
+
+        for index, key_of in [
+            (self._by_expansion, lambda c: c.expansion),
+            (self._by_rarity, lambda c: c.rarity),
+            (self._by_casting_identity, lambda c: c.casting_identity),
+        ]:
+            if replacing:
+                old_cards = index[key_of(replacing)]
+                if key_of(replacing) == key_of(card) and replacing.full_name == card.full_name:
+                    old_cards[card.full_name] = card
+                    continue
+                del old_cards[replacing.full_name]
+                if not old_cards:
+                    del index[key_of(replacing)]
+            index.setdefault(key_of(card), dict())[card.full_name] = card
+
+        if replacing:
+            self._by_number.pop((replacing.expansion, str(replacing.number)), None)
+        self._by_number[(card.expansion, str(card.number))] = card
+
+    def _lookup(self, card_name: str) -> Optional[Card]:
+        """
+        Finds a card in the cache by its full name, or by the name of its front face.
+        :param card_name: The name to look for.
+        :return: The card, if it is in the cache.
+        """
+        card = self._card_cache.get(card_name)
+        if card is None and card_name in self._names:
+            card = self._card_cache.get(self._names[card_name])
+        return card
+    # endregion Indexes
+
+    @staticmethod
+    def _encode_query(query: str) -> str:
+        return query.replace(' ', '+').replace('=', '%3D').replace(':', '%3A')
+
+    def _search_locally(self, query: str) -> Optional[dict[str, Card]]:
+        """
+        Searches the local index, if the cache has one.
+        :param query: The query to use, following Scryfall's search syntax.
+        :return: The matching cards, or None if the query has to be sent to Scryfall.
+        """
+        if self.local_index is None:
+            return None
+
+        try:
+            return self.local_index.search(query)
+        except UnsupportedQueryError as e:
+            logging.debug(f"Searching Scryfall for '{query}', as it can't be run locally: {e}")
+            return None
+
     def populate_cache_by_query(self, query) -> None:
         """
         Populates the card cache with results from searching scryfall using a query.
+        If the cache has a local index, it is searched instead, unless the query isn't supported by it.
         :param query: The query to use, following Scryfall's search syntax.
         """
-        query = query.replace(' ', '+').replace('=', '%3D').replace(':', '%3A')
-        cards = Scryfall.scryfall_search(query)
-        for card in cards.values():
+        for card in self.search(query).values():
             self._add_to_cache(card)
 
+    async def populate_cache_by_queries_async(self, *queries: str) -> None:
+        """
+        Populates the card cache with the results of several queries, which are searched concurrently.
+        Results are added in the order of the queries, so the cache ends up the same as if they were run one by one.
+        :param queries: The queries to use, following Scryfall's search syntax.
+        """
+        results = await asyncio.gather(*(self.search_async(query) for query in queries))
+        self.populate_cache_by_results(*results)
+
+    def populate_cache_by_results(self, *results: dict[str, Card]) -> None:
+        """
+        Populates the card cache with search results that have already been fetched, in order.
+        :param results: The results of `search` or `search_async`, for each query.
+        """
+        for cards in results:
+            for card in cards.values():
+                self._add_to_cache(card)
+
+    def search(self, query: str) -> dict[str, Card]:
+        """
+        Searches for cards without adding them to the cache, using the local index if the query is supported by it.
+        :param query: The query to use, following Scryfall's search syntax.
+        :return: The matching cards, by full name, or by Scryfall id for `unique:prints` queries run locally.
+        """
+        cards = self._search_locally(query)
+        if cards is None:
+            cards = Scryfall.scryfall_search(self._encode_query(query))
+        return cards
+
+    async def search_async(self, query: str) -> dict[str, Card]:
+        """The same as `search`, but searching Scryfall without blocking the event loop."""
+        cards = self._search_locally(query)
+        if cards is None:
+            cards = await AsyncScryfall.scryfall_search(self._encode_query(query))
+        return cards
+
     def populate_cache_by_expansion(self, expansion) -> None:
         """
         Popluates the card cache with results for a specific set.
@@ -84,21 +250,51 @@ class CardCache:
         for card in cards.values():
             self._add_to_cache(card)
 
-    @cache
+    def populate_cache_by_card_keys(self, *keys: CardKey) -> list[CardKey]:
+        """
+        Populates the card cache with specific cards, fetching them from Scryfall in batches.
+        :param keys: The set and name of each card.
+        :return: The keys that couldn't be resolved to a card.
+        """
+        identifiers = [{"set": expansion.lower(), "name": name} for expansion, name in keys]
+        cards = Scryfall.scryfall_collection(identifiers)
+
+        unresolved = list()
+        for key, card in zip(keys, cards):
+            if card is None:
+                unresolved.append(key)
+            else:
+                self._add_to_cache(card)
+        if unresolved:
+            logging.warning(f"Could not find {len(unresolved)} cards: {', '.join(f'{e}: {n}' for e, n in unresolved)}")
+        return unresolved
+
+    def _remember_lookup(self, key: tuple, card: Optional[Card]) -> None:
+        if card is None:
+            self._lookups.set(key, _NOT_FOUND, self.negative_ttl)
+        else:
+            self._lookups.set(key, card, float('inf'))
+
     def get_card_data(self, card_name) -> Optional[Card]:
         """
         Gets data for a card, by name. Uses Scryfall's fuzzy match, if a card can't be found in the cache.
         :param card_name: The name of the card.
         :return: The card data, if found.
         """
-        if card_name in self._card_cache:
-            return self._card_cache[card_name]
+        card = self._lookup(card_name)
+        if card:
+            return card
+
+        key = ('name', card_name)
+        remembered = self._lookups.get(key)
+        if remembered is not None:
+            return None if remembered is _NOT_FOUND else remembered
 
         card = Scryfall.scryfall_card(f"named?fuzzy={card_name}")
         self._add_to_cache(card)
+        self._remember_lookup(key, card)
         return card
 
-    @cache
     def get_card_data_by_set(self, card_name, expansion, number) -> Optional[Card]:
         """
         Gets data for a card, using its name, set and collector number.
@@ -108,19 +304,49 @@ class CardCache:
         :param number: The card's collector number in the set.
         :return: The card data, if found.
         """
-        card = self._card_cache.get(card_name, None)
+        card = self._by_number.get((expansion.upper(), str(number)))
+        if card:
+            return card
+
+        card = self._lookup(card_name)
         if card and card.expansion.lower() == expansion.lower():
             return card
 
+        key = ('number', expansion.lower(), str(number))
+        remembered = self._lookups.get(key)
+        if remembered is not None:
+            return None if remembered is _NOT_FOUND else remembered
+
         card = Scryfall.scryfall_card(f"{expansion.lower()}/{number}")
         self._add_to_cache(card)
+        self._remember_lookup(key, card)
         return card
 
-    def card_list(self, expansion: Optional[str] = None):
+    def card_list(self, expansion: Optional[str] = None) -> list[Card]:
         if expansion:
-            return [card for card in self._card_cache.values() if card.expansion == expansion.upper()]
+            return list(self._by_expansion.get(expansion.upper(), dict()).values())
         else:
             return list(self._card_cache.values())
 
+    def cards_by_rarity(self, rarity: str) -> list[Card]:
+        return list(self._by_rarity.get(rarity, dict()).values())
+
+    def cards_by_casting_identity(self, casting_identity: str) -> list[Card]:
+        return list(self._by_casting_identity.get(casting_identity, dict()).values())
+
+    def get_cached_card_by_number(self, expansion: str, number: str) -> Optional[Card]:
+        """
+        Gets a card already in the cache by its set and collector number, without going to Scryfall.
+        :param expansion: The set the card comes from.
+        :param number: The card's collector number in the set.
+        :return: The card, if it is in the cache.
+        """
+        return self._by_number.get((expansion.upper(), str(number)))
+
+    @property
+    def expansions(self) -> list[str]:
+        """The set codes of the cards in the cache, in the order they were first added."""
+        return list(self._by_expansion)
+
     def __len__(self):
         return len(self._card_cache)
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import json
+import os
 
-from definitions import CONFIG_DIR
+from definitions import CONFIG_DIR, ROOT_DIR
 
 
 class Config(dict):
@@ -48,7 +49,7 @@ class Config(dict):
 
 
 class SetGeneratorConfig(Config):
-    # TODO: Implement checks to ensure we have the data we need to run.
+    DEFAULT_OUTPUT_ROOT = "Generated Documents"
 
     @staticmethod
     def load_json(path: str):
@@ -56,26 +57,47 @@ class SetGeneratorConfig(Config):
             result = Config.__load__(json.loads(f.read()))
 
         result = SetGeneratorConfig._sanitize(result)
-        SetGeneratorConfig._validate(result)
+        SetGeneratorConfig._validate(result, path)
         return result
 
-    # TODO: Implement logic to repair missing data.
+    @staticmethod
+    def output_dir(self: SetGeneratorConfig) -> str:
+        """
+        Where the set's documents are written: a folder named after the set, under the config's `output_root`.
+        :return: The absolute path of the folder.
+        """
+        return os.path.join(ROOT_DIR, self.document_context.output_root, self.set_context.set_code.upper())
+
     @staticmethod
     def _sanitize(self: SetGeneratorConfig):
+        """Fills in the optional settings that are missing, so they can be read with dot notation."""
+        set_context = self.get('set_context')
+        if isinstance(set_context, dict):
+            set_context.setdefault('bonus_set_code', None)
+
+        document_context = self.setdefault('document_context', Config())
+        if isinstance(document_context, dict):
+            document_context.setdefault('reviewers', list())
+            document_context.setdefault('output_root', SetGeneratorConfig.DEFAULT_OUTPUT_ROOT)
         return self
 
-    # TODO: Check for missing irreparable data.
     @staticmethod
-    def _validate(self: SetGeneratorConfig):
-        valid = True
+    def _validate(self: SetGeneratorConfig, path: str = ''):
+        set_context = self.get('set_context')
+        valid = (
+            isinstance(set_context, dict)
+            and isinstance(set_context.get('set_code'), str)
+            and isinstance(set_context.get('scryfall_queries'), list)
+            and all(isinstance(query, str) for query in set_context['scryfall_queries'])
+            and isinstance(self.document_context, dict)
+            and isinstance(self.document_context.get('reviewers'), list)
+        )
 
         if not valid:
-            raise ValueError("Invalid config detected")
+            raise ValueError(f"Invalid config detected: '{path}'")
 
 
 if __name__ == "__main__":
-    import os
-
     config = SetGeneratorConfig.load_json(os.path.join(CONFIG_DIR, "OTJ.json"))
     print(config.set_context.set_code)
     print(config.set_context.bonus_set_code)
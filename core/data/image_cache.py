@@ -0,0 +1,171 @@
+from typing import Optional
+from collections import OrderedDict
+from hashlib import sha256
+
+import logging
+import os
+import tempfile
+import threading
+
+from definitions import IMAGE_CACHE_DIR
+
+
+class ImageCache:
+    """
+    A size-capped, on-disk store of image bytes, keyed by the url they were downloaded from.
+
+    Scryfall stamps each image url with a version query string, so a url always refers to the same
+    bytes, and hashing the url gives a stable, content-addressed file name. Once the total size of the
+    cache goes over `max_bytes`, the least recently used images are evicted.
+
+    Several processes can share one cache folder. Each keeps its own index, so the index is rebuilt
+    from the files on disk before evicting, and images another process added are found on disk.
+    """
+    DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+    # Evicting down to a little under the cap means the folder is only rescanned every so often, not on every put.
+    EVICTION_TARGET = 0.9
+
+    cache_dir: str
+    max_bytes: int
+    _index: Optional[OrderedDict[str, int]]
+    _total_bytes: int
+
+    def __init__(self, cache_dir: str = IMAGE_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index = None
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        """
+        Builds the LRU index from the files on disk, the first time the cache is used.
+        File modification times are used as access times, since reads touch the file.
+        :return: A mapping of keys to file sizes, from least to most recently used.
+        """
+        if self._index is not None:
+            return self._index
+
+        entries = list()
+        if os.path.isdir(self.cache_dir):
+            for directory, _, files in os.walk(self.cache_dir):
+                for file_name in files:
+                    if file_name.endswith('.tmp'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(directory, file_name))
+                    except FileNotFoundError:
+                        # Evicted by another process while we were scanning.
+                        continue
+                    entries.append((stat.st_mtime, file_name, stat.st_size))
+
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+        return self._index
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        Gets the bytes stored for a url, marking them as recently used.
+        :param url: The url the image was downloaded from.
+        :return: The image bytes, if they are cached.
+        """
+        key = self._key(url)
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                # Another process may have stored it since the index was built.
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    return None
+                index[key] = size
+                self._total_bytes += size
+
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                logging.debug(f"Cached image for '{url}' could not be read, dropping it")
+                self._total_bytes -= index.pop(key)
+                return None
+
+            index.move_to_end(key)
+            return data
+
+    def put(self, url: str, data: bytes) -> None:
+        """
+        Stores the bytes for a url, evicting the least recently used images if the cache is over its size cap.
+        :param url: The url the image was downloaded from.
+        :param data: The image bytes.
+        """
+        key = self._key(url)
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Write to a uniquely named temporary file first, so a crash never leaves a truncated image behind,
+            # and writers in other processes never share a temporary file.
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+                f.write(data)
+            os.replace(f.name, path)
+
+            self._total_bytes += len(data) - index.pop(key, 0)
+            index[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        # Other processes may have added or evicted images, so recount what is actually on disk first.
+        self._index = None
+        index = self._load_index()
+        target_bytes = self.max_bytes * self.EVICTION_TARGET
+        while self._total_bytes > target_bytes and len(index) > 1:
+            key, size = index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            logging.debug(f"Evicted image '{key}' from the image cache")
+
+    def clear(self) -> None:
+        """Removes every image from the cache."""
+        with self._lock:
+            index = self._load_index()
+            while index:
+                key, _ = index.popitem()
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load_index()
+            return self._total_bytes
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return self._key(url) in self._load_index()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load_index())
+
+
+IMAGE_CACHE = ImageCache()
@@ -0,0 +1,482 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable, Optional
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import operator
+import re
+
+from core.game_concepts.card import Card
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised when a query can't be answered locally, either because of its syntax or missing data."""
+
+
+# region Index
+class IndexedCard:
+    """The fields of a card that queries can filter on, extracted from its raw data when it is indexed."""
+    __slots__ = (
+        'card', 'seq', 'expansion', 'number', 'number_value', 'name', 'type_line', 'type_words',
+        'released_at', 'reprint', 'games', 'rarity'
+    )
+
+    def __init__(self, card_data: dict, seq: int):
+        self.card = Card(card_data)
+        self.seq = seq
+        self.expansion = card_data['set'].lower()
+        self.number = card_data.get('collector_number', '')
+        digits = re.match(r'\d+', self.number)
+        self.number_value = int(digits.group()) if digits else None
+        self.name = card_data.get('name', '').lower()
+        self.type_line = self.card.type_line.lower()
+        self.type_words = frozenset(re.findall(r"[\w'-]+", self.type_line))
+        released_at = card_data.get('released_at')
+        self.released_at = date.fromisoformat(released_at) if released_at else None
+        self.reprint = card_data.get('reprint', False)
+        self.games = frozenset(card_data.get('games', ()))
+        self.rarity = card_data.get('rarity', '')
+
+    @property
+    def sort_key(self) -> tuple:
+        # Matches Scryfall's `order=set`, which sorts by set and then collector number.
+        return self.expansion, self.number_value if self.number_value is not None else -1, self.number
+
+
+class LocalCardIndex:
+    """
+    A searchable, in-memory corpus of cards, with indexes on set, collector number, type and release date.
+
+    Searches support the subset of Scryfall's syntax used by the set configs, such as `set:blb unique:cards cn<=261`,
+    `(set:spg and date=blb)` or `set:m3c t:legendary t:creature -is:reprint`. Anything outside of that subset
+    raises an `UnsupportedQueryError`, so callers can fall back to asking Scryfall.
+    """
+    records: list[IndexedCard]
+    by_set: dict[str, list[int]]
+    by_type_word: dict[str, list[int]]
+    by_date: dict[date, list[int]]
+    by_number: list[tuple[int, int]]
+    set_release: dict[str, date]
+
+    @classmethod
+    def from_bulk_file(cls, path: str, predicate: Optional[Callable[[dict], bool]] = None) -> LocalCardIndex:
+        """
+        Indexes the cards in a Scryfall bulk data file.
+        :param path: The path to the bulk file.
+        :param predicate: An optional filter on the raw card data, to index less of the corpus.
+        """
+        from core.data.bulk import iter_bulk_json
+
+        index = cls()
+        for card_data in iter_bulk_json(path):
+            if card_data.get('object') == 'card' and (predicate is None or predicate(card_data)):
+                index.add(card_data)
+        return index
+
+    def __init__(self, cards: Iterable[dict] = ()):
+        self.records = list()
+        self.by_set = dict()
+        self.by_type_word = dict()
+        self.by_date = dict()
+        self.by_number = list()
+        self.set_release = dict()
+        self._number_sorted = True
+        for card_data in cards:
+            self.add(card_data)
+
+    def add(self, card_data: dict) -> None:
+        """
+        Adds a card to the index.
+        :param card_data: The raw Scryfall data for the card.
+        """
+        seq = len(self.records)
+        record = IndexedCard(card_data, seq)
+        self.records.append(record)
+
+        self.by_set.setdefault(record.expansion, list()).append(seq)
+        for word in record.type_words:
+            self.by_type_word.setdefault(word, list()).append(seq)
+        if record.released_at is not None:
+            self.by_date.setdefault(record.released_at, list()).append(seq)
+            release = self.set_release.get(record.expansion)
+            if release is None or record.released_at < release:
+                self.set_release[record.expansion] = record.released_at
+        if record.number_value is not None:
+            self.by_number.append((record.number_value, seq))
+            self._number_sorted = False
+
+    def numbers_between(self, low: float, high: float, inclusive: tuple[bool, bool]) -> set[int]:
+        if not self._number_sorted:
+            self.by_number.sort()
+            self._number_sorted = True
+        before, after = -1, len(self.records)
+        if inclusive[0]:
+            start = bisect_left(self.by_number, (low, before))
+        else:
+            start = bisect_right(self.by_number, (low, after))
+        if inclusive[1]:
+            end = bisect_right(self.by_number, (high, after))
+        else:
+            end = bisect_left(self.by_number, (high, before))
+        return {seq for _, seq in self.by_number[start:end]}
+
+    def search(self, query: str) -> dict[str, Card]:
+        """
+        Searches the index, like `Scryfall.scryfall_search`.
+        :param query: The query, in Scryfall's search syntax (not url encoded).
+        :return: The matching cards by name, in set and collector number order.
+        With `unique:prints`, every printing is returned, keyed by its Scryfall id instead.
+        :raises UnsupportedQueryError: If the query can't be answered from the index.
+        """
+        parsed = parse_query(query)
+        candidates = parsed.expression.candidates(self)
+        records = self.records if candidates is None else [self.records[seq] for seq in candidates]
+        matches = sorted((record for record in records if parsed.expression.matches(record, self)),
+                         key=lambda record: record.sort_key)
+
+        if parsed.unique == 'prints':
+            return {record.card.scryfall_id: record.card for record in matches}
+
+        # Otherwise, Scryfall returns the first printing of each card.
+        cards = dict()
+        for record in matches:
+            cards.setdefault(record.card.full_name, record.card)
+        return cards
+
+    def __len__(self):
+        return len(self.records)
+# endregion Index
+
+
+# region Expressions
+class Expression:
+    def matches(self, record: IndexedCard, index: LocalCardIndex) -> bool:
+        raise NotImplementedError
+
+    def candidates(self, index: LocalCardIndex) -> Optional[set[int]]:
+        """
+        Narrows down which records could match, using the index.
+        :return: A superset of the matching records, or None if every record has to be checked.
+        """
+        return None
+
+
+class And(Expression):
+    def __init__(self, children: list[Expression]):
+        self.children = children
+
+    def matches(self, record, index):
+        return all(child.matches(record, index) for child in self.children)
+
+    def candidates(self, index):
+        result = None
+        for child in self.children:
+            child_candidates = child.candidates(index)
+            if child_candidates is not None:
+                result = child_candidates if result is None else result & child_candidates
+        return result
+
+
+class Or(Expression):
+    def __init__(self, children: list[Expression]):
+        self.children = children
+
+    def matches(self, record, index):
+        return any(child.matches(record, index) for child in self.children)
+
+    def candidates(self, index):
+        result = set()
+        for child in self.children:
+            child_candidates = child.candidates(index)
+            if child_candidates is None:
+                return None
+            result |= child_candidates
+        return result
+
+
+class Not(Expression):
+    def __init__(self, child: Expression):
+        self.child = child
+
+    def matches(self, record, index):
+        return not self.child.matches(record, index)
+
+
+class Always(Expression):
+    """Terms that change how results are returned, rather than which cards match, such as `unique:`."""
+    def matches(self, record, index):
+        return True
+
+
+_COMPARISONS: dict[str, Callable] = {
+    ':': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+class SetTerm(Expression):
+    def __init__(self, op: str, value: str):
+        if op not in {':', '='}:
+            raise UnsupportedQueryError(f"Unsupported operator for set: '{op}'")
+        self.expansion = value.lower()
+
+    def matches(self, record, index):
+        return record.expansion == self.expansion
+
+    def candidates(self, index):
+        if self.expansion not in index.by_set:
+            raise UnsupportedQueryError(f"Set '{self.expansion}' is not in the local index")
+        return set(index.by_set[self.expansion])
+
+
+class NumberTerm(Expression):
+    def __init__(self, op: str, value: str):
+        if not value.isdigit():
+            raise UnsupportedQueryError(f"Unsupported collector number: '{value}'")
+        self.op = op
+        self.compare = _COMPARISONS[op]
+        self.value = int(value)
+
+    def matches(self, record, index):
+        return record.number_value is not None and self.compare(record.number_value, self.value)
+
+    def candidates(self, index):
+        ranges = {
+            ':': (self.value, self.value, (True, True)),
+            '=': (self.value, self.value, (True, True)),
+            '<': (float('-inf'), self.value, (True, False)),
+            '<=': (float('-inf'), self.value, (True, True)),
+            '>': (self.value, float('inf'), (False, True)),
+            '>=': (self.value, float('inf'), (True, True)),
+        }
+        if self.op not in ranges:
+            return None
+        return index.numbers_between(*ranges[self.op])
+
+
+class TypeTerm(Expression):
+    def __init__(self, op: str, value: str):
+        if op not in {':', '='}:
+            raise UnsupportedQueryError(f"Unsupported operator for type: '{op}'")
+        self.value = value.lower()
+
+        # Whole words only, so eg. `t:ape` doesn't match 'Shapeshifter'. Quoted values can span several words.
+        self.pattern = re.compile(rf"(?<![\w'-]){re.escape(self.value)}(?![\w'-])")
+
+    def matches(self, record, index):
+        return self.pattern.search(record.type_line) is not None
+
+    def candidates(self, index):
+        words = re.findall(r"[\w'-]+", self.value)
+        if not words:
+            return None
+        return set(index.by_type_word.get(words[0], ()))
+
+
+class DateTerm(Expression):
+    def __init__(self, op: str, value: str):
+        self.compare = _COMPARISONS[op]
+        self.value = value.lower()
+        self.day = None
+        if re.fullmatch(r'[\d-]+', self.value):
+            # Scryfall also accepts years and months, which would need comparing as ranges, so only full dates are
+            #  answered locally.
+            try:
+                self.day = date.fromisoformat(self.value) if len(self.value) == 10 else None
+            except ValueError:
+                pass
+            if self.day is None:
+                raise UnsupportedQueryError(f"Unsupported date: '{value}'")
+
+    def target(self, index: LocalCardIndex) -> date:
+        if self.day is not None:
+            return self.day
+        if self.value not in index.set_release:
+            raise UnsupportedQueryError(f"Release date for set '{self.value}' is not in the local index")
+        return index.set_release[self.value]
+
+    def matches(self, record, index):
+        return record.released_at is not None and self.compare(record.released_at, self.target(index))
+
+    def candidates(self, index):
+        target = self.target(index)
+        result = set()
+        for released_at, seqs in index.by_date.items():
+            if self.compare(released_at, target):
+                result.update(seqs)
+        return result
+
+
+class NameTerm(Expression):
+    def __init__(self, op: str, value: str, exact: bool):
+        if op not in {':', '='}:
+            raise UnsupportedQueryError(f"Unsupported operator for name: '{op}'")
+        self.value = value.lower()
+        self.exact = exact
+
+    def matches(self, record, index):
+        if self.exact:
+            return self.value == record.name or self.value in record.name.split(' // ')
+        return self.value in record.name
+
+
+class FlagTerm(Expression):
+    def __init__(self, value: str):
+        if value.lower() != 'reprint':
+            raise UnsupportedQueryError(f"Unsupported flag: 'is:{value}'")
+
+    def matches(self, record, index):
+        return record.reprint
+
+
+class GameTerm(Expression):
+    def __init__(self, value: str):
+        self.value = value.lower()
+
+    def matches(self, record, index):
+        return self.value in record.games
+
+
+class RarityTerm(Expression):
+    RARITY_ORDER = {'common': 0, 'uncommon': 1, 'rare': 2, 'special': 3, 'mythic': 4, 'bonus': 5}
+    ABBREVIATIONS = {'c': 'common', 'u': 'uncommon', 'r': 'rare', 's': 'special', 'm': 'mythic', 'b': 'bonus'}
+
+    def __init__(self, op: str, value: str):
+        rarity = self.ABBREVIATIONS.get(value.lower(), value.lower())
+        if rarity not in self.RARITY_ORDER:
+            raise UnsupportedQueryError(f"Unknown rarity: '{value}'")
+        self.compare = _COMPARISONS[op]
+        self.value = self.RARITY_ORDER[rarity]
+
+    def matches(self, record, index):
+        return self.compare(self.RARITY_ORDER.get(record.rarity, -1), self.value)
+# endregion Expressions
+
+
+# region Parsing
+class ParsedQuery:
+    expression: Expression
+    unique: str
+
+    def __init__(self, expression: Expression, unique: str):
+        self.expression = expression
+        self.unique = unique
+
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<open>-?\()
+      | (?P<close>\))
+      | (?P<term>-?(?:(?P<key>[a-zA-Z]+)(?P<op><=|>=|!=|:|=|<|>))?(?P<value>"[^"]*"|[^\s()]+))
+    )''', re.VERBOSE)
+
+
+def _tokenize(query: str) -> list[re.Match]:
+    tokens, position = list(), 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if not match or match.end() == position:
+            raise UnsupportedQueryError(f"Could not parse query at: '{query[position:]}'")
+        tokens.append(match)
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, query: str):
+        self.tokens = _tokenize(query)
+        self.position = 0
+        self.unique = 'cards'
+
+    def peek(self) -> Optional[re.Match]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    @staticmethod
+    def is_keyword(token: Optional[re.Match], keyword: str) -> bool:
+        return token is not None and token.group('term') is not None and token.group(0).strip().lower() == keyword
+
+    def parse(self) -> ParsedQuery:
+        expression = self.parse_or()
+        if self.peek() is not None:
+            raise UnsupportedQueryError(f"Unexpected '{self.peek().group(0).strip()}' in query")
+        return ParsedQuery(expression, self.unique)
+
+    def parse_or(self) -> Expression:
+        children = [self.parse_and()]
+        while self.is_keyword(self.peek(), 'or'):
+            self.position += 1
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self) -> Expression:
+        children = [self.parse_unary()]
+        while True:
+            token = self.peek()
+            if token is None or token.group('close') or self.is_keyword(token, 'or'):
+                break
+            if self.is_keyword(token, 'and'):
+                self.position += 1
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self) -> Expression:
+        token = self.peek()
+        if token is None:
+            raise UnsupportedQueryError("Query ended unexpectedly")
+        self.position += 1
+
+        if token.group('open'):
+            expression = self.parse_or()
+            closing = self.peek()
+            if closing is None or not closing.group('close'):
+                raise UnsupportedQueryError("Unbalanced parentheses in query")
+            self.position += 1
+            return Not(expression) if token.group('open').startswith('-') else expression
+
+        if token.group('close'):
+            raise UnsupportedQueryError("Unbalanced parentheses in query")
+
+        negated = token.group('term').startswith('-')
+        expression = self.parse_term(token.group('key'), token.group('op'), token.group('value').strip('"'))
+        return Not(expression) if negated else expression
+
+    def parse_term(self, key: Optional[str], op: Optional[str], value: str) -> Expression:
+        if key is None:
+            return NameTerm(':', value, exact=False)
+
+        key = key.lower()
+        if key in {'set', 's', 'e', 'edition'}:
+            return SetTerm(op, value)
+        if key in {'cn', 'number'}:
+            return NumberTerm(op, value)
+        if key in {'t', 'type'}:
+            return TypeTerm(op, value)
+        if key == 'date':
+            return DateTerm(op, value)
+        if key == 'name':
+            return NameTerm(op, value, exact=op == '=')
+        if key == 'is' and op == ':':
+            return FlagTerm(value)
+        if key == 'game' and op == ':':
+            return GameTerm(value)
+        if key in {'r', 'rarity'}:
+            return RarityTerm(op, value)
+        if key == 'unique' and op == ':':
+            if value.lower() not in {'cards', 'prints'}:
+                raise UnsupportedQueryError(f"Unsupported option: 'unique:{value}'")
+            self.unique = value.lower()
+            return Always()
+        raise UnsupportedQueryError(f"Unsupported search keyword: '{key}{op}'")
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """
+    Parses a query in Scryfall's search syntax.
+    :param query: The query to parse.
+    :return: The parsed query.
+    :raises UnsupportedQueryError: If the query uses syntax outside of the supported subset.
+    """
+    return _Parser(query).parse()
+# endregion Parsing
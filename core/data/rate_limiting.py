@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from time import monotonic, sleep
+
+from core.metrics import METRICS
+
+
+class RateLimiter:
+    """
+    A token bucket that keeps requests under `rate` per second, allowing short bursts of up to `burst` requests.
+
+    Callers reserve a token while holding a lock, and then wait outside of it, so a single limiter
+    can be shared by any number of threads and event loops. Tokens refill while the caller is busy,
+    so a slow response or a cache hit in between requests means less (or no) waiting for the next one.
+    """
+    rate: float
+    burst: float
+    _tokens: float
+    _last_refill: float
+
+    request_count: int
+    wait_count: int
+    total_wait: float
+    max_wait: float
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last_refill = monotonic()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def _reserve(self) -> float:
+        """
+        Takes a token from the bucket, going into debt if it is empty.
+        :return: How long the caller must wait before its token is valid, in seconds.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.request_count += 1
+            if delay > 0:
+                self.wait_count += 1
+                self.total_wait += delay
+                self.max_wait = max(self.max_wait, delay)
+            return delay
+
+    def wait(self) -> None:
+        """Blocks the current thread until the caller is allowed to make its request."""
+        delay = self._reserve()
+        METRICS.observe('rate_limiter.wait', delay)
+        if delay > 0:
+            sleep(delay)
+
+    async def wait_async(self) -> None:
+        """Suspends the current task until the caller is allowed to make its request."""
+        delay = self._reserve()
+        METRICS.observe('rate_limiter.wait', delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.request_count = 0
+            self.wait_count = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def stats(self) -> dict[str, float]:
+        """
+        Gets a summary of how much time callers have spent waiting on the limiter.
+        :return: The number of requests, how many of them had to wait, and the total, mean and max wait times.
+        """
+        with self._lock:
+            return {
+                "requests": self.request_count,
+                "waits": self.wait_count,
+                "total_wait": self.total_wait,
+                "mean_wait": self.total_wait / self.wait_count if self.wait_count else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+# Scryfall asks for 50-100 milliseconds between requests, so I try to be a good netizen.
+SCRYFALL_RATE_LIMITER = RateLimiter(rate=10)
@@ -0,0 +1,142 @@
+from typing import Any, Optional
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from time import time
+
+from core.data.ttl_cache import TTLCache
+from definitions import CACHE_DIR
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Checked in order, the first pattern that matches a url decides how long its response is kept.
+#  Specific printings rarely change, while searches pick up new cards as a set is previewed.
+TTL_RULES: list[tuple[re.Pattern, float]] = [
+    (re.compile(r'/cards/search\?'), 6 * HOUR),
+    (re.compile(r'/cards/named\?'), DAY),
+    (re.compile(r'/cards/[^/?]+/[^/?]+$'), 30 * DAY),
+]
+DEFAULT_TTL = DAY
+
+
+def ttl_for_url(url: str) -> float:
+    """
+    Gets how long the response for a url should be cached, in seconds.
+    :param url: The requested url.
+    :return: The TTL for the url's class.
+    """
+    for pattern, ttl in TTL_RULES:
+        if pattern.search(url):
+            return ttl
+    return DEFAULT_TTL
+
+
+class ResponseCache:
+    """
+    Caches parsed JSON responses by url, in a bounded in-memory LRU backed by an SQLite database on disk.
+    Entries expire according to `TTL_RULES`, so a restarted process is warm without serving stale searches.
+    """
+    DEFAULT_PATH = os.path.join(CACHE_DIR, "responses.sqlite3")
+
+    path: Optional[str]
+    _memory: TTLCache[str, Any]
+    _connection: Optional[sqlite3.Connection]
+
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, maxsize: int = 256):
+        """
+        :param path: Where to keep the database. If None, responses are only cached in memory.
+        :param maxsize: How many responses to keep in memory.
+        """
+        self.path = path
+        self._memory = TTLCache(maxsize)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._connection is None and self.path is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, body TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._connection.execute("DELETE FROM responses WHERE expires <= ?", (time(),))
+            self._connection.commit()
+        return self._connection
+
+    def get(self, url: str) -> Optional[Any]:
+        """
+        Gets the parsed response for a url, checking memory first and then the disk.
+        :param url: The requested url.
+        :return: The parsed JSON, if a fresh copy is cached.
+        """
+        data = self._memory.get(url)
+        if data is not None:
+            return data
+
+        with self._lock:
+            connection = self._connect()
+            if connection is None:
+                return None
+            row = connection.execute("SELECT body, expires FROM responses WHERE url = ?", (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        body, expires = row
+        remaining = expires - time()
+        if remaining <= 0:
+            return None
+
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            logging.debug(f"Dropping corrupt cached response for '{url}'")
+            self.invalidate(url)
+            return None
+
+        self._memory.set(url, data, remaining)
+        return data
+
+    def set(self, url: str, data: Any, body: Optional[str] = None) -> None:
+        """
+        Caches the parsed response for a url.
+        :param url: The requested url.
+        :param data: The parsed JSON.
+        :param body: The raw response text, if available, to avoid serializing `data` again.
+        """
+        ttl = ttl_for_url(url)
+        self._memory.set(url, data, ttl)
+
+        with self._lock:
+            connection = self._connect()
+            if connection is None:
+                return
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (url, body, expires) VALUES (?, ?, ?)",
+                (url, body if body is not None else json.dumps(data), time() + ttl)
+            )
+            connection.commit()
+
+    def invalidate(self, url: str) -> None:
+        self._memory.pop(url)
+        with self._lock:
+            connection = self._connect()
+            if connection is not None:
+                connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+                connection.commit()
+
+    def clear(self) -> None:
+        self._memory.clear()
+        with self._lock:
+            connection = self._connect()
+            if connection is not None:
+                connection.execute("DELETE FROM responses")
+                connection.commit()
+
+
+RESPONSE_CACHE = ResponseCache()
@@ -1,25 +1,66 @@
-from typing import Optional
-from functools import cache
+from typing import Any, Optional
 
+import asyncio
 import logging
+import math
 import requests
-from time import sleep
+from urllib.parse import quote, urlencode
 
+from core.data.response_cache import RESPONSE_CACHE
+from core.data.sessions import SCRYFALL_SESSION
 from core.game_concepts.card import Card
+from core.metrics import METRICS
+
+
+class ScryfallError(Exception):
+    """Raised when Scryfall answers a search with an error, so partial results are never mistaken for complete ones."""
+    def __init__(self, url: str, error: dict):
+        super().__init__(f"Scryfall returned {error.get('status')} for '{url}': {error.get('details')}")
+        self.error = error
 
 
 class Scryfall:
+    COLLECTION_BATCH_SIZE = 75
+
     @classmethod
-    @cache
-    def request(cls, url: str) -> requests.Response:
+    def request(cls, url: str) -> Any:
         """
-        Request data from a url, with an automatic delay that Scryfall requests.
+        Request data from a url through the shared Scryfall session, which keeps to the spacing Scryfall requests.
+        Successful responses are kept in the response cache, so repeated requests are served locally.
         :param url: The url to request data from.
-        :return: The response from the request.
+        :return: The parsed JSON of the response.
+        """
+        data = RESPONSE_CACHE.get(url)
+        if data is not None:
+            METRICS.increment('response_cache.hits')
+            return data
+
+        METRICS.increment('response_cache.misses')
+        with METRICS.span('scryfall.request', url=url):
+            return cls._parse_response(url, SCRYFALL_SESSION.get(url))
+
+    @staticmethod
+    def _parse_response(url: str, response: requests.Response) -> Any:
+        """
+        Parses a response, caching it if it succeeded.
+        :param url: The url that was requested.
+        :param response: The response to it.
+        :return: The parsed JSON. Failures come back as a Scryfall error object, even if the body wasn't one,
+        eg. a 5xx error page.
         """
-        response = requests.get(url)
-        sleep(0.1)  # Scryfall requests this, so I try to be a good netizen.
-        return response
+        if response.ok:
+            data = response.json()
+            RESPONSE_CACHE.set(url, data, response.text)
+            return data
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or data.get('object') != 'error':
+            logging.warning(f"Scryfall returned {response.status_code} for '{url}'")
+            data = {'object': 'error', 'status': response.status_code, 'details': response.reason}
+        return data
 
     @classmethod
     def scryfall_search(cls, query: str) -> dict[str, Card]:
@@ -27,16 +68,35 @@ class Scryfall:
         Search scryfall for multiple cards, populating the card cache with the results.
         :param query: The query to use, formatted for url.
         :return: A list of names added to the cache.
+        :raises ScryfallError: If any page fails, rather than returning partial results.
         """
         cards = dict()
         url = f"https://api.scryfall.com/cards/search?format=json&order=set&q={query}"
+        first_page = True
         while url:
-            all_data = cls.request(url).json()
+            all_data = cls.request(url)
+            cards |= {card_data['name']: Card(card_data) for card_data in cls._page_data(url, all_data, first_page)}
             url = all_data.get('next_page', None)
-            cards |= {card_data['name']: Card(card_data) for card_data in all_data['data']}
+            first_page = False
 
         return cards
 
+    @staticmethod
+    def _page_data(url: str, page: dict, first_page: bool) -> list[dict]:
+        """
+        Gets the cards on a page of search results.
+        :param url: The url of the page.
+        :param page: The parsed page.
+        :param first_page: Whether this is the first page, where Scryfall's not found error means there are no results.
+        :return: The card data on the page.
+        :raises ScryfallError: If the page is an error, so the results would be incomplete.
+        """
+        if page.get('object') == 'error':
+            if first_page and page.get('code') == 'not_found':
+                return list()
+            raise ScryfallError(url, page)
+        return page['data']
+
     @classmethod
     def scryfall_card(cls, query: str) -> Optional[Card]:
         """
@@ -45,10 +105,133 @@ class Scryfall:
         :return: The card data, if found.
         """
         url = f"https://api.scryfall.com/cards/{query}"
-        data = cls.request(url).json()
+        return cls._parse_card(url, cls.request(url))
 
+    @staticmethod
+    def _parse_card(url: str, data: Any) -> Optional[Card]:
         if data["object"] == 'card':
             return Card(data)
         else:
             logging.warning(f"Could not find card for '{url}'")
             return None
+
+    @classmethod
+    def scryfall_collection(cls, identifiers: list[dict[str, str]]) -> list[Optional[Card]]:
+        """
+        Fetch many specific cards at once from Scryfall's collection endpoint, in batches of 75.
+        If a batch fails, eg. because it was rate limited, its cards are looked up one at a time instead.
+        :param identifiers: Card identifiers, as Scryfall accepts them, eg. `{"name": ..., "set": ...}`.
+        :return: The card found for each identifier, in the same order, or None for those that weren't found.
+        """
+        cards = list()
+        url = "https://api.scryfall.com/cards/collection"
+        for start in range(0, len(identifiers), cls.COLLECTION_BATCH_SIZE):
+            batch = identifiers[start:start + cls.COLLECTION_BATCH_SIZE]
+            response = SCRYFALL_SESSION.post(url, json={"identifiers": batch})
+            data = response.json() if response.ok else None
+            batch_cards = cls._match_collection(batch, data) if data and data.get('object') != 'error' else None
+            if batch_cards is None:
+                logging.warning(
+                    f"Could not fetch card collection ({response.status_code}), looking cards up one by one"
+                )
+                batch_cards = [cls._identifier_card(identifier) for identifier in batch]
+            cards.extend(batch_cards)
+
+        return cards
+
+    @staticmethod
+    def _match_collection(batch: list[dict[str, str]], data: dict) -> Optional[list[Optional[Card]]]:
+        """
+        Matches the cards in a collection response back to the identifiers that were sent.
+        Scryfall returns the cards it found in the order they were asked for, and echoes back the identifiers
+        it couldn't find, so the cards line up with the identifiers that aren't in `not_found`.
+        :param batch: The identifiers that were sent.
+        :param data: The response.
+        :return: The card for each identifier, or None if the response can't be matched up.
+        """
+        found, not_found = data.get('data', list()), data.get('not_found', list())
+        if len(found) + len(not_found) != len(batch):
+            return None
+
+        def normalize(identifier: dict[str, str]) -> tuple:
+            return tuple(sorted((key, str(value).lower()) for key, value in identifier.items()))
+
+        missing = {normalize(identifier) for identifier in not_found}
+        is_missing = [normalize(identifier) in missing for identifier in batch]
+        if sum(is_missing) != len(not_found):
+            return None
+        found = iter(found)
+        return [None if identifier_missing else Card(next(found)) for identifier_missing in is_missing]
+
+    @classmethod
+    def _identifier_card(cls, identifier: dict[str, str]) -> Optional[Card]:
+        """
+        Looks up a single card by a collection identifier.
+        :param identifier: An identifier by Scryfall id, or by name with an optional set.
+        :return: The card, if found.
+        """
+        if 'id' in identifier:
+            return cls.scryfall_card(quote(identifier['id']))
+        if 'name' in identifier:
+            params = {'exact': identifier['name']}
+            if 'set' in identifier:
+                params['set'] = identifier['set']
+            return cls.scryfall_card(f"named?{urlencode(params)}")
+        return None
+
+
+class AsyncScryfall:
+    """
+    An asyncio counterpart to `Scryfall`, with the same search surface.
+    Requests share the same session, rate limiter and response cache as the synchronous client.
+    """
+    @classmethod
+    async def request(cls, url: str) -> Any:
+        """
+        Request data from a url, without blocking the event loop.
+        :param url: The url to request data from.
+        :return: The parsed JSON of the response.
+        """
+        data = RESPONSE_CACHE.get(url)
+        if data is not None:
+            METRICS.increment('response_cache.hits')
+            return data
+
+        # Coroutines interleave on one thread, so these requests aren't traced as spans, only counted.
+        METRICS.increment('response_cache.misses')
+        return Scryfall._parse_response(url, await SCRYFALL_SESSION.get_async(url))
+
+    @classmethod
+    async def scryfall_search(cls, query: str) -> dict[str, Card]:
+        """
+        Search scryfall for multiple cards. Once the first page says how many cards there are,
+        the remaining pages are requested concurrently, and merged back in page order.
+        :param query: The query to use, formatted for url.
+        :return: The cards found, by name.
+        :raises ScryfallError: If any page fails, rather than returning partial results.
+        """
+        url = f"https://api.scryfall.com/cards/search?format=json&order=set&q={query}"
+        first_page = await cls.request(url)
+        urls, pages = [url], [first_page]
+
+        if first_page.get('has_more'):
+            page_size = len(first_page['data'])
+            page_count = math.ceil(first_page['total_cards'] / page_size)
+            urls += [f"{url}&page={page}" for page in range(2, page_count + 1)]
+            pages += await asyncio.gather(*(cls.request(page_url) for page_url in urls[1:]))
+
+        cards = dict()
+        for number, (page_url, page) in enumerate(zip(urls, pages)):
+            page_data = Scryfall._page_data(page_url, page, first_page=number == 0)
+            cards |= {card_data['name']: Card(card_data) for card_data in page_data}
+        return cards
+
+    @classmethod
+    async def scryfall_card(cls, query: str) -> Optional[Card]:
+        """
+        Search scryfall for a specific card.
+        :param query: The url parameter/path for the card.
+        :return: The card data, if found.
+        """
+        url = f"https://api.scryfall.com/cards/{query}"
+        return Scryfall._parse_card(url, await cls.request(url))
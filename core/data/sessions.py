@@ -0,0 +1,139 @@
+from typing import Optional
+
+import asyncio
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.data.rate_limiting import RateLimiter, SCRYFALL_RATE_LIMITER
+from core.metrics import METRICS
+
+
+class _RateLimitedRetry(Retry):
+    """
+    Retries that wait on a rate limiter after backing off, so retried requests count against the same
+    budget as every other request, rather than bursting past it from inside urllib3.
+    """
+    rate_limiter: Optional[RateLimiter]
+
+    def __init__(self, *args, rate_limiter: Optional[RateLimiter] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwargs) -> '_RateLimitedRetry':
+        # urllib3 makes a new Retry for every attempt, so the limiter has to be carried over.
+        retry = super().new(**kwargs)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def sleep(self, response=None) -> None:
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+
+
+class ScryfallSession:
+    """
+    A pooled, keep-alive HTTP session for talking to Scryfall's API and image hosts.
+
+    Each host gets its own connection pool, sized to how many requests are expected to be in flight at once.
+    Rate limited (429) and server error (5xx) responses to idempotent requests are retried with exponential
+    backoff, honouring any `Retry-After` header Scryfall sends back. Every request, and every retry,
+    waits on the shared rate limiter first. POSTs are never retried here, so callers handle their failures.
+    """
+    API_HOST = "https://api.scryfall.com"
+    IMAGE_HOST = "https://cards.scryfall.io"
+
+    DEFAULT_POOL_SIZES = {
+        API_HOST: 4,
+        IMAGE_HOST: 16,
+    }
+    DEFAULT_HEADERS = {
+        "User-Agent": "MTG-Set-Review-Document-Generator/1.0",
+        "Accept": "application/json;q=0.9,*/*;q=0.8",
+        "Accept-Encoding": "gzip, deflate",
+    }
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    session: requests.Session
+    rate_limiter: RateLimiter
+    timeout: float
+
+    def __init__(
+            self,
+            pool_sizes: Optional[dict[str, int]] = None,
+            retries: int = 5,
+            backoff_factor: float = 0.5,
+            timeout: float = 30,
+            rate_limiter: RateLimiter = SCRYFALL_RATE_LIMITER
+    ):
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.DEFAULT_HEADERS)
+
+        retry = _RateLimitedRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            rate_limiter=rate_limiter,
+        )
+        for host, pool_size in (pool_sizes or self.DEFAULT_POOL_SIZES).items():
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+            self.session.mount(host, adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Makes a GET request once the rate limiter allows it.
+        :param url: The url to request.
+        :return: The response, after any retries.
+        """
+        self.rate_limiter.wait()
+        response = self.session.get(url, timeout=kwargs.pop('timeout', self.timeout), **kwargs)
+        return self._record(response, kwargs.get('stream', False))
+
+    async def get_async(self, url: str, **kwargs) -> requests.Response:
+        """
+        Makes a GET request from a coroutine, waiting on the rate limiter without blocking the event loop.
+        The request itself runs on a worker thread, so it still shares this session's connection pools.
+        :param url: The url to request.
+        :return: The response, after any retries.
+        """
+        await self.rate_limiter.wait_async()
+        response = await asyncio.to_thread(
+            self.session.get, url, timeout=kwargs.pop('timeout', self.timeout), **kwargs
+        )
+        return self._record(response, kwargs.get('stream', False))
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Makes a POST request once the rate limiter allows it.
+        :param url: The url to post to.
+        :return: The response, after any retries.
+        """
+        self.rate_limiter.wait()
+        return self._record(self.session.post(url, timeout=kwargs.pop('timeout', self.timeout), **kwargs))
+
+    @staticmethod
+    def _record(response: requests.Response, stream: bool = False) -> requests.Response:
+        """Counts a response in the metrics, if they are enabled."""
+        if METRICS.enabled:
+            METRICS.increment('http.requests')
+            METRICS.increment(f'http.status.{response.status_code}')
+            METRICS.observe('http.latency', response.elapsed.total_seconds())
+            if not stream:
+                # Reading the body of a streamed response here would consume it before the caller could.
+                METRICS.increment('http.bytes', len(response.content))
+            retries = getattr(response.raw, 'retries', None)
+            if retries is not None:
+                METRICS.increment('http.retries', len(retries.history))
+        return response
+
+    def close(self) -> None:
+        self.session.close()
+
+
+SCRYFALL_SESSION = ScryfallSession()
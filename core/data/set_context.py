@@ -1,15 +1,33 @@
 
+from typing import Optional
+
+import logging
+import os
+from time import time
+
 from core.data.caching import CardCache, CardKey
+from core.data.config import SetGeneratorConfig
+from core.data.query import LocalCardIndex
+from core.data.response_cache import HOUR
+from core.data.snapshot import Snapshot, SnapshotMismatchError, SnapshotProvenance, read_snapshot, snapshot_path, \
+    write_snapshot
 from core.game_concepts.card import Card
-from core.game_concepts.ordering import order
+from core.game_concepts.ordering import BucketedOrdering
 
 
 class SetContext:
+    # Snapshots older than this are rebuilt, as search results are only cached for as long.
+    DEFAULT_SNAPSHOT_MAX_AGE = 6 * HOUR
+
     set_code: str
     bonus_set_code: str
     card_cache: CardCache
-    _day_one_cards: list[Card]
-    _day_two_cards: list[Card]
+    # The queries the cards were loaded with, if they were loaded by query.
+    queries: tuple[str, ...]
+    # Built the first time the cards are ordered, and then kept up to date as cards are added to the cache.
+    _ordering: Optional[BucketedOrdering]
+    # None until the lists have been computed from the ordering, and again whenever a card is added.
+    _card_orders: Optional[tuple[list[Card], list[Card]]]
 
     @classmethod
     def from_expansions(cls, set_code: str, bonus_set_code: str, *expansions: str, print_card_list: bool = False):
@@ -17,56 +35,158 @@ class SetContext:
         return cls(set_code, bonus_set_code, card_cache, print_card_list)
 
     @classmethod
-    def from_queries(cls, set_code: str, bonus_set_code: str, *queries: str, print_card_list: bool = False):
-        card_cache = CardCache.from_queries(*queries)
+    def from_queries(cls, set_code: str, bonus_set_code: str, *queries: str, print_card_list: bool = False,
+                     local_index: Optional[LocalCardIndex] = None):
+        card_cache = CardCache.from_queries(*queries, local_index=local_index)
+        return cls(set_code, bonus_set_code, card_cache, print_card_list, queries)
+
+    @classmethod
+    def from_bulk_file(cls, set_code: str, bonus_set_code: str, path: str, *expansions: str,
+                       print_card_list: bool = False):
+        card_cache = CardCache.from_bulk_file(path, *expansions)
         return cls(set_code, bonus_set_code, card_cache, print_card_list)
 
+    @classmethod
+    async def from_queries_async(cls, set_code: str, bonus_set_code: str, *queries: str, print_card_list: bool = False,
+                                 local_index: Optional[LocalCardIndex] = None):
+        card_cache = await CardCache.from_queries_async(*queries, local_index=local_index)
+        return cls(set_code, bonus_set_code, card_cache, print_card_list, queries)
+
     @classmethod
     def from_card_keys(cls, set_code: str, bonus_set_code: str, *keys: CardKey, print_card_list: bool = False):
         card_cache = CardCache.from_card_keys(*keys)
         return cls(set_code, bonus_set_code, card_cache, print_card_list)
 
     @classmethod
-    def from_config(cls):
-        # TODO: Load these from a config file
-        set_code = None
-        bonus_set_code = None
-        queries = list()
-        return cls.from_queries(set_code, bonus_set_code, *queries)
-
-    def __init__(self, set_code: str, bonus_set_code: str, card_cache: CardCache, print_card_list: bool = False):
+    def from_snapshot(cls, path: str, set_code: str, bonus_set_code: Optional[str], *queries: str,
+                      print_card_list: bool = False, max_age: Optional[float] = None):
+        """
+        Loads a set context saved by `save_snapshot`, checking it was built for the same set and queries.
+        :param path: The snapshot file.
+        :param set_code: The set the snapshot should be for.
+        :param bonus_set_code: The bonus sheet the snapshot should be for.
+        :param queries: The queries the snapshot should have been built from.
+        :param max_age: How old the snapshot can be, in seconds. If None, any age is accepted.
+        :raises SnapshotMismatchError: If the snapshot is from another version, or for different inputs, or too old.
+        """
+        snapshot = read_snapshot(path)
+        provenance = snapshot.provenance
+        if not provenance.matches(set_code, bonus_set_code, queries):
+            raise SnapshotMismatchError(f"'{path}' was built for {provenance.set_code} from {provenance.queries}")
+        if max_age is not None and time() - provenance.created > max_age:
+            raise SnapshotMismatchError(f"'{path}' is older than {max_age} seconds")
+
+        card_cache = CardCache()
+        for card in snapshot.cards:
+            card_cache._add_to_cache(card)
+        set_context = cls(set_code, bonus_set_code, card_cache, queries=queries)
+        set_context._card_orders = (snapshot.day_one_cards, snapshot.day_two_cards)
+        set_context._print_card_list(print_card_list)
+        return set_context
+
+    @classmethod
+    def from_snapshot_or_queries(cls, set_code: str, bonus_set_code: Optional[str], *queries: str,
+                                 print_card_list: bool = False, max_age: Optional[float] = DEFAULT_SNAPSHOT_MAX_AGE,
+                                 path: Optional[str] = None):
+        """
+        Loads the set's snapshot if there is a usable one, and otherwise searches the queries and saves a new one.
+        :param path: The snapshot file. Defaults to the set's file in `SNAPSHOT_DIR`.
+        :param max_age: How old the snapshot can be, in seconds. If None, any age is accepted.
+        """
+        path = path if path else snapshot_path(set_code)
+        if os.path.exists(path):
+            try:
+                return cls.from_snapshot(path, set_code, bonus_set_code, *queries,
+                                         print_card_list=print_card_list, max_age=max_age)
+            except (OSError, SnapshotMismatchError) as e:
+                logging.info(f"Rebuilding '{set_code}': {e}")
+
+        set_context = cls.from_queries(set_code, bonus_set_code, *queries, print_card_list=print_card_list)
+        set_context.save_snapshot(path)
+        return set_context
+
+    @classmethod
+    def from_search_results(cls, set_code: str, bonus_set_code: Optional[str], queries: tuple[str, ...],
+                            results: dict[str, dict[str, Card]], print_card_list: bool = False):
+        """
+        Builds a set context from search results that have already been fetched, eg. shared between several sets.
+        :param queries: The set's queries, in order.
+        :param results: The cards found by each query, including at least the set's queries.
+        """
+        card_cache = CardCache()
+        card_cache.populate_cache_by_results(*(results[query] for query in queries))
+        return cls(set_code, bonus_set_code, card_cache, print_card_list, queries)
+
+    @classmethod
+    def from_config(cls, config: SetGeneratorConfig, print_card_list: bool = False,
+                    max_age: Optional[float] = DEFAULT_SNAPSHOT_MAX_AGE):
+        """
+        Loads the set described by a config, from its snapshot if it has a usable one.
+        :param config: A loaded set generator config.
+        :param max_age: How old the snapshot can be, in seconds. If None, any age is accepted.
+        """
+        set_config = config.set_context
+        return cls.from_snapshot_or_queries(set_config.set_code, set_config.bonus_set_code,
+                                            *set_config.scryfall_queries,
+                                            print_card_list=print_card_list, max_age=max_age)
+
+    def __init__(self, set_code: str, bonus_set_code: str, card_cache: CardCache, print_card_list: bool = False,
+                 queries: tuple[str, ...] = ()):
         self.set_code = set_code
         self.bonus_set_code = bonus_set_code
         self.card_cache = card_cache
-        self._day_one_cards, self._day_two_cards = list(), list()
+        self.queries = tuple(queries)
+        self._ordering = None
+        self._card_orders = None
 
         self.card_cache.on_edit = self.on_cache_update
 
         print(f"Loaded {len(card_cache)} cards for '{set_code}'")
+        self._print_card_list(print_card_list)
 
+    def _print_card_list(self, print_card_list: bool) -> None:
         if print_card_list:
             print("Cards: ")
             for card in self.sorted_card_list:
                 print(repr(card))
             print(" - - - - - - - - - - \n")
 
-    def get_card_orders(self):
-        self._day_one_cards, self._day_two_cards = order(self.card_cache, self.set_code, self.bonus_set_code)
-
-    def on_cache_update(self):
-        self._day_one_cards, self._day_two_cards = list(), list()
+    def get_card_orders(self) -> tuple[list[Card], list[Card]]:
+        if self._ordering is None:
+            self._ordering = BucketedOrdering(self.card_cache.card_list())
+        if self._card_orders is None:
+            self._card_orders = self._ordering.order(self.set_code, self.bonus_set_code)
+        return self._card_orders
+
+    def on_cache_update(self, card: Card, replaced: Optional[Card] = None):
+        """
+        Inserts a card added to the cache into the ordering, rather than ordering every card again.
+        :param card: The card that was added.
+        :param replaced: The card it replaced, if any.
+        """
+        if self._ordering is not None:
+            self._ordering.add(card, replaced)
+        self._card_orders = None
 
     @property
     def day_one_cards(self) -> list[Card]:
-        if not self._day_one_cards:
-            self.get_card_orders()
-        return self._day_one_cards
+        return self.get_card_orders()[0]
 
     @property
     def day_two_cards(self) -> list[Card]:
-        if not self._day_two_cards:
-            self.get_card_orders()
-        return self._day_two_cards
+        return self.get_card_orders()[1]
+
+    def save_snapshot(self, path: Optional[str] = None) -> str:
+        """
+        Saves the cards and their order, along with the set and queries they came from, for `from_snapshot`.
+        :param path: The snapshot file. Defaults to the set's file in `SNAPSHOT_DIR`.
+        :return: The path the snapshot was saved to.
+        """
+        path = path if path else snapshot_path(self.set_code)
+        day_one_cards, day_two_cards = self.get_card_orders()
+        provenance = SnapshotProvenance.now(self.set_code, self.bonus_set_code, self.queries)
+        write_snapshot(path, Snapshot(provenance, self.card_cache.card_list(), day_one_cards, day_two_cards))
+        return path
 
     @property
     def sorted_card_list(self) -> list[Card]:
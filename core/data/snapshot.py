@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import NamedTuple, Optional
+
+import json
+import mmap
+import os
+import pickle
+import struct
+from hashlib import sha256
+from time import time
+
+from core.game_concepts.card import Card
+from core.game_concepts.card_types import TypeLine
+from definitions import CACHE_DIR
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "Snapshots")
+
+# Bump whenever the file format, or the payload's structure, changes.
+SNAPSHOT_VERSION = 2
+
+# A digest of the layout of the classes pickled in the payload, so snapshots written before a field was added to,
+#  removed from or renamed in one of them are rejected up front, rather than failing, or half loading, when unpickled.
+SNAPSHOT_LAYOUT = sha256(repr((Card.__slots__, TypeLine._fields)).encode('utf-8')).digest()[:8]
+
+# Magic bytes, format version, class layout and the length of the JSON header that follows.
+_PREAMBLE = struct.Struct('<8sH8sI')
+_MAGIC = b'MTGSNAP\0'
+
+
+class SnapshotMismatchError(ValueError):
+    """Raised when a snapshot can't be used, because of its format or because it was built from different inputs."""
+
+
+class SnapshotProvenance(NamedTuple):
+    set_code: str
+    bonus_set_code: Optional[str]
+    queries: tuple[str, ...]
+    created: float
+
+    @classmethod
+    def now(cls, set_code: str, bonus_set_code: Optional[str], queries: tuple[str, ...]) -> SnapshotProvenance:
+        return cls(set_code, bonus_set_code, tuple(queries), time())
+
+    def matches(self, set_code: str, bonus_set_code: Optional[str], queries: tuple[str, ...]) -> bool:
+        return (self.set_code, self.bonus_set_code, self.queries) == (set_code, bonus_set_code, tuple(queries))
+
+
+class Snapshot(NamedTuple):
+    provenance: SnapshotProvenance
+    # Every card in the cache, in the order they were added.
+    cards: list[Card]
+    day_one_cards: list[Card]
+    day_two_cards: list[Card]
+
+
+def snapshot_path(set_code: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{set_code.upper()}.snapshot")
+
+
+def write_snapshot(path: str, snapshot: Snapshot) -> None:
+    """
+    Writes a snapshot, replacing any existing file atomically.
+
+    The file starts with a small binary preamble and a JSON header holding the provenance, so it can be
+    checked without unpickling anything. The cards follow as a single pickle (protocol 5), in which the
+    day one and day two lists refer back to the cards rather than storing them again.
+    :param path: Where to write the snapshot.
+    :param snapshot: The snapshot to write.
+    """
+    header = json.dumps(snapshot.provenance._asdict()).encode('utf-8')
+    payload = pickle.dumps(
+        (snapshot.cards, snapshot.day_one_cards, snapshot.day_two_cards), protocol=5
+    )
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(_PREAMBLE.pack(_MAGIC, SNAPSHOT_VERSION, SNAPSHOT_LAYOUT, len(header)))
+        f.write(header)
+        f.write(payload)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    Reads a snapshot, memory-mapping the file rather than reading it into memory first.
+    :param path: The snapshot file.
+    :return: The snapshot.
+    :raises SnapshotMismatchError: If the file isn't a snapshot, is corrupt, or was written by another version,
+    or with a different layout of `Card`.
+    """
+    with open(path, 'rb') as f:
+        # An empty file can't be mapped at all, eg. one left behind by an interrupted write.
+        if os.fstat(f.fileno()).st_size == 0:
+            raise SnapshotMismatchError(f"'{path}' is not a snapshot")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # The magic and version come first in every version of the preamble, so they can always be checked.
+            if len(mapped) < struct.calcsize('<8sH'):
+                raise SnapshotMismatchError(f"'{path}' is not a snapshot")
+            magic, version = struct.unpack_from('<8sH', mapped)
+            if magic != _MAGIC:
+                raise SnapshotMismatchError(f"'{path}' is not a snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotMismatchError(f"'{path}' is a version {version} snapshot, expected {SNAPSHOT_VERSION}")
+            if len(mapped) < _PREAMBLE.size:
+                raise SnapshotMismatchError(f"'{path}' is corrupt: its preamble is truncated")
+            _, _, layout, header_length = _PREAMBLE.unpack_from(mapped)
+            if layout != SNAPSHOT_LAYOUT:
+                raise SnapshotMismatchError(f"'{path}' was written for a different layout of its cards")
+
+            header_end = _PREAMBLE.size + header_length
+            view = memoryview(mapped)
+            try:
+                header = json.loads(mapped[_PREAMBLE.size:header_end])
+                header['queries'] = tuple(header['queries'])
+                provenance = SnapshotProvenance(**header)
+                cards, day_one_cards, day_two_cards = pickle.loads(view[header_end:])
+            except Exception as e:
+                # Unpickling can fail in almost any way, eg. an AttributeError or ImportError for a class that
+                #  has changed since the snapshot was written. Whatever the cause, the snapshot just has to be rebuilt.
+                raise SnapshotMismatchError(f"'{path}' is corrupt: {e!r}") from e
+            finally:
+                # The map can't be closed while a view of it is still alive.
+                view.release()
+
+    return Snapshot(provenance, cards, day_one_cards, day_two_cards)
@@ -0,0 +1,71 @@
+from typing import Generic, Hashable, Optional, TypeVar
+from collections import OrderedDict
+
+import threading
+from time import monotonic
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A thread-safe, in-memory LRU cache holding at most `maxsize` entries, each of which expires after its own TTL.
+    """
+    maxsize: int
+    _entries: OrderedDict[K, tuple[V, float]]
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """
+        Gets a value from the cache, marking it as recently used.
+        :param key: The key to look up.
+        :param default: What to return if the key is missing or expired.
+        :return: The cached value, if present and fresh.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires = entry
+            if expires <= monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V, ttl: float) -> None:
+        """
+        Adds a value to the cache, evicting the least recently used entries if it is full.
+        :param key: The key to store the value under.
+        :param value: The value to store.
+        :param ttl: How long the value stays valid, in seconds.
+        """
+        with self._lock:
+            self._entries[key] = (value, monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: K) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,43 +1,72 @@
 from typing import Optional
 import logging
-import requests
-from time import sleep
 from io import BytesIO
+from sys import intern
 
 from PIL import Image
 
-from core.game_concepts.card_types import SUPERTYPES, TYPES, SUBTYPES
-from core.game_concepts.colors import parse_color_list, get_color_identity
+from core.data.image_cache import IMAGE_CACHE
+from core.data.sessions import SCRYFALL_SESSION
+from core.game_concepts.card_types import TypeLine, parse_type_line
+from core.game_concepts.colors import IDENTITY_BY_MASK, color_list_mask, mana_cost_mask
+from core.metrics import METRICS
+
+# Distinguishes a back face image that hasn't been loaded yet from a card that has no back face.
+_NOT_LOADED = object()
 
 
 class Card:
+    """
+    The data needed about a card to review it, extracted from its Scryfall data.
+
+    Cards are slotted, and keep their colors and types as bitmasks, with repeated strings interned,
+    so that caches of tens of thousands of cards stay small. The raw Scryfall data is dropped once
+    the card is built, unless `keep_json` is set.
+    """
+    __slots__ = (
+        'scryfall_id', 'expansion', 'number', 'rarity', 'full_name', 'name', 'layout', 'mana_cost', 'cmc',
+        '_colors', '_color_identity', '_casting_identity', 'type_info',
+        'front_image_url', 'back_image_url', '_json', '_front_face', '_back_face',
+        '_front_image', '_back_image', '_full_card_image',
+    )
+
     scryfall_id: str
     expansion: str
     number: int
     rarity: str
     full_name: str
     name: str
+    layout: str
     mana_cost: str
     cmc: int
-    colors: str
-    color_identity: str
-    casting_identity: str
-    type_line: str
-    all_types: set[str]
-    supertypes: set[str]
-    types: set[str]
-    subtypes: set[str]
+    _colors: int
+    _color_identity: int
+    _casting_identity: int
+    type_info: TypeLine
     front_image_url: str
     back_image_url: Optional[str]
+    _json: Optional[dict]
+    _front_image: Optional[Image.Image]
+    _back_image: Optional[Image.Image]
+    _full_card_image: Optional[Image.Image]
 
-    def __init__(self, json: dict):
+    def __init__(self, json: dict, keep_json: bool = False):
+        """
+        :param json: The card's data from Scryfall.
+        :param keep_json: Whether to keep the raw data, which is otherwise dropped once the card is built.
+        """
         self._json = json
+        self.release_images()
         self._populate_card_face_data()
         self._populate_collector_data()
         self._populate_cost_data()
         self._populate_types()
         self._populate_image_data()
 
+        self._front_face = self._back_face = None
+        if not keep_json:
+            self._json = None
+
     # region Initialization
     def _parse_from_json(self, key, default=None):
         # Attempt to get the value from general card information.
@@ -56,7 +85,7 @@ class Card:
         #  Because of how mana cost and colour are stored, they are likely to be empty,
         #  so we skip logging when they're missing, to avoid cluttering up the log.
         if key not in ['mana_cost', 'colors']:  # pragma: nocover
-            logging.debug(f"'{key}' is empty for card '{self.name}'")
+            logging.debug(f"'{key}' is empty for card '{self._json.get('name')}'")
         return default
 
     @classmethod
@@ -82,7 +111,7 @@ class Card:
             self._front_face = self._json
             self._back_face = None
 
-        self.layout = self._parse_from_json('layout')
+        self.layout = intern(self._parse_from_json('layout'))
 
         # NOTE: Some custom handling has to be done to identify aftermath card frames.
         if self.layout == 'split':
@@ -92,9 +121,9 @@ class Card:
 
     def _populate_collector_data(self):
         self.scryfall_id = self._json['id']
-        self.expansion = self._json['set'].upper()
+        self.expansion = intern(self._json['set'].upper())
         self.number = self._parse_from_json('collector_number')
-        self.rarity = self._parse_from_json('rarity')
+        self.rarity = intern(self._parse_from_json('rarity'))
         self.full_name = self._parse_from_json('name')
         if self.layout in {'split'}:
             self.name = self.full_name
@@ -102,18 +131,14 @@ class Card:
             self.name = self._front_face.get('name', self.full_name)
 
     def _populate_cost_data(self):
-        self.mana_cost = self._parse_from_json('mana_cost', '')
+        self.mana_cost = intern(self._parse_from_json('mana_cost', ''))
         self.cmc = self._parse_from_json('cmc', 0)
-        self.colors = parse_color_list(self._parse_from_json('colors', ''))
-        self.color_identity = parse_color_list(self._parse_from_json('color_identity', ''))
-        self.casting_identity = get_color_identity(self.mana_cost)
+        self._colors = color_list_mask(self._parse_from_json('colors', ''))
+        self._color_identity = color_list_mask(self._parse_from_json('color_identity', ''))
+        self._casting_identity = mana_cost_mask(self.mana_cost)
 
     def _populate_types(self):
-        self.type_line = self._parse_from_json('type_line', '')
-        self.all_types = set(self.type_line.split(' ')) - {'—', '//'}
-        self.supertypes = self.all_types & SUPERTYPES
-        self.types = self.all_types & TYPES
-        self.subtypes = self.all_types & SUBTYPES
+        self.type_info = parse_type_line(self._parse_from_json('type_line', ''))
 
     def _populate_image_data(self):
         if self.layout in {'adventure', 'split', 'aftermath', 'flip'}:
@@ -124,48 +149,167 @@ class Card:
             self.back_image_url = self._get_image_url(self._back_face)
     # endregion Initialization
 
+    @property
+    def colors(self) -> str:
+        return IDENTITY_BY_MASK[self._colors]
+
+    @property
+    def color_identity(self) -> str:
+        return IDENTITY_BY_MASK[self._color_identity]
+
+    @property
+    def casting_identity(self) -> str:
+        return IDENTITY_BY_MASK[self._casting_identity]
+
+    @property
+    def color_identity_mask(self) -> int:
+        return self._color_identity
+
+    @property
+    def casting_identity_mask(self) -> int:
+        return self._casting_identity
+
+    @property
+    def type_line(self) -> str:
+        return self.type_info.text
+
+    @property
+    def supertypes(self) -> frozenset[str]:
+        return self.type_info.supertypes
+
+    @property
+    def types(self) -> frozenset[str]:
+        return self.type_info.types
+
+    @property
+    def subtypes(self) -> frozenset[str]:
+        return self.type_info.subtypes
+
+    @property
+    def all_types(self) -> frozenset[str]:
+        return self.type_info.all_types
+
+    @property
+    def raw_json(self) -> Optional[dict]:
+        """The card's Scryfall data, if it was kept when the card was built."""
+        return self._json
+
     @property
     def card_url(self) -> str:
         """Shortened link to the Scryfall page for the card"""
         return f"https://scryfall.com/card/{self.expansion.lower()}/{self.number}"
 
+    @classmethod
+    def get_face_image_data(cls, url: str) -> bytes:
+        """
+        Gets the bytes of a face image, preferring the on-disk image cache over downloading it.
+        :param url: The url of the image.
+        :return: The encoded image.
+        :raises requests.HTTPError: If the image couldn't be downloaded.
+        """
+        image_data = IMAGE_CACHE.get(url)
+        if image_data is not None:
+            METRICS.increment('image_cache.hits')
+            return image_data
+
+        METRICS.increment('image_cache.misses')
+        with METRICS.span('image.download'):
+            response = SCRYFALL_SESSION.get(url)
+        # An error page would otherwise be decoded, or fingerprinted, as if it were the image.
+        response.raise_for_status()
+        image_data = response.content
+        IMAGE_CACHE.put(url, image_data)
+        return image_data
+
     @classmethod
     def _get_face_image(cls, url: str) -> Optional[Image.Image]:
         if url:
-            sleep(0.1)  # Scryfall requests this, so I try to be a good netizen.
-            image_data = requests.get(url).content
-            return Image.open(BytesIO(image_data))
+            # Opening only reads the header. The pixels are decoded on first use, within whichever span uses them.
+            return Image.open(BytesIO(cls.get_face_image_data(url)))
         else:
             return None
 
+    @property
+    def image_urls(self) -> list[str]:
+        """The urls of the card's face images."""
+        return [url for url in (self.front_image_url, self.back_image_url) if url]
+
+    @property
+    def is_rotated(self) -> bool:
+        """Whether the front face image has to be rotated to be read, as with battles and split cards."""
+        return "Battle" in self.all_types or self.layout == "split"
+
+    @property
+    def original_image_data(self) -> Optional[bytes]:
+        """
+        The encoded bytes of the card's image as Scryfall serves them, if they can be used as the full card image
+        without any changes. This is the case for single faced cards that don't need rotating.
+        """
+        if self.back_image_url or self.is_rotated or not self.front_image_url:
+            return None
+        return self.get_face_image_data(self.front_image_url)
+
     @property
     def front_image(self) -> Image.Image:
-        image = self._get_face_image(self.front_image_url)
-        if "Battle" in self.all_types or self.layout == "split":
-            image = image.rotate(270, expand=True)
-        return image
+        if self._front_image is None:
+            image = self._get_face_image(self.front_image_url)
+            if self.is_rotated:
+                image = image.rotate(270, expand=True)
+            self._front_image = image
+        return self._front_image
 
     @property
     def back_image(self) -> Optional[Image.Image]:
-        return self._get_face_image(self.back_image_url)
+        if self._back_image is _NOT_LOADED:
+            self._back_image = self._get_face_image(self.back_image_url)
+        return self._back_image
 
     @property
     def full_card_image(self) -> Image.Image:
-        if not self.back_image:
-            return self.front_image
+        if self._full_card_image is not None:
+            return self._full_card_image
+
+        front_image, back_image = self.front_image, self.back_image
+        if not back_image:
+            self._full_card_image = front_image
+            return front_image
 
         merge_image_size = (
-            self.front_image.size[0] + self.back_image.size[0],
-            max(self.front_image.size[1], self.back_image.size[1])
+            front_image.size[0] + back_image.size[0],
+            max(front_image.size[1], back_image.size[1])
         )
-        merged_image = Image.new("RGBA", merge_image_size, (255, 255, 255, 255))
-
-        front_image_location = (0, (merged_image.size[1] - self.front_image.size[1]) // 2)
-        back_image_location = (self.front_image.size[0], (merged_image.size[1] - self.back_image.size[1]) // 2)
-        merged_image.paste(self.front_image, front_image_location)
-        merged_image.paste(self.back_image, back_image_location)
+        with METRICS.span('image.compose'):
+            merged_image = Image.new("RGBA", merge_image_size, (255, 255, 255, 255))
+
+            front_image_location = (0, (merged_image.size[1] - front_image.size[1]) // 2)
+            back_image_location = (front_image.size[0], (merged_image.size[1] - back_image.size[1]) // 2)
+            merged_image.paste(front_image, front_image_location)
+            merged_image.paste(back_image, back_image_location)
+        self._full_card_image = merged_image
         return merged_image
 
+    def release_images(self) -> None:
+        """
+        Drops the decoded images held by the card, so their pixels can be freed.
+        They will be loaded again if they are accessed afterwards.
+        """
+        self._front_image = None
+        self._back_image = _NOT_LOADED
+        self._full_card_image = None
+
+    # region Pickling
+    _IMAGE_SLOTS = ('_front_image', '_back_image', '_full_card_image')
+
+    def __getstate__(self) -> dict:
+        # Decoded images are left out, since they can be loaded again and the back face's sentinel can't be pickled.
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot not in self._IMAGE_SLOTS}
+
+    def __setstate__(self, state: dict) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.release_images()
+    # endregion Pickling
+
     def __str__(self):
         return self.full_name
 
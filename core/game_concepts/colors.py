@@ -1,4 +1,5 @@
 from typing import Optional
+from functools import lru_cache
 
 import logging
 import re
@@ -53,6 +54,30 @@ SET_REVIEW_COLOR_ORDER: dict[str, int] = {
 }
 
 
+COLOR_BITS: dict[str, int] = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+
+# The color identity string for each of the 32 possible color masks, in 'WUBRG' order.
+IDENTITY_BY_MASK: list[str] = [''.join(c for c in 'WUBRG' if mask & COLOR_BITS[c]) for mask in range(32)]
+
+
+def color_mask(color_identity: str) -> int:
+    """
+    Converts a color identity string into a 5-bit mask, with one bit per color in 'WUBRG'.
+    :param color_identity: A color identity string.
+    :return: The color mask.
+    """
+    mask = 0
+    for c in color_identity:
+        mask |= COLOR_BITS[c]
+    return mask
+
+
+# The same orderings as above, indexed by color mask rather than by string.
+SET_REVIEW_COLOR_ORDER_BY_MASK: list[int] = [SET_REVIEW_COLOR_ORDER[identity] for identity in IDENTITY_BY_MASK]
+GROUP_COLOR_COMBINATION_MASKS: list[int] = [color_mask(identity) for identity in GROUP_COLOR_COMBINATIONS]
+GROUP_INDEX_BY_MASK: list[int] = [GROUP_COLOR_COMBINATIONS.index(identity) for identity in IDENTITY_BY_MASK]
+
+
 def get_color_string(text: Optional[str]) -> str:
     """
     Takes in a string, and attempts to convert it to a color string, with some amount
@@ -86,6 +111,17 @@ def get_color_string(text: Optional[str]) -> str:
     return ret
 
 
+@lru_cache(maxsize=4096)
+def mana_cost_mask(text: Optional[str]) -> int:
+    """
+    Parses a mana cost, or any color string, into a color mask, with the same forgiveness as `get_color_string`.
+    Results are memoized, since the same costs repeat heavily across a set.
+    :param text: The mana cost or color string to parse.
+    :return: The color mask of the colors in the string.
+    """
+    return color_mask(get_color_string(text))
+
+
 def get_color_identity(text: str) -> str:
     """
     Takes in a color string, and attempts to convert it to a
@@ -93,19 +129,54 @@ def get_color_identity(text: str) -> str:
     :param text: The color string to convert.
     :return: A color identity string, a subset of 'WUBRG', in 'WUBRG' order.
     """
+    return IDENTITY_BY_MASK[mana_cost_mask(text)]
 
-    # Get the colour string, and put it into a set to remove duplicate characters.
-    color_string = get_color_string(text)
-    char_set = set(color_string)
 
-    # Removes any non-COLOR symbols from the set, converting it to a COLOR_IDENTITY
-    color_identity = ''.join(c for c in 'WUBRG' if c in char_set)
-    return color_identity
+def color_list_mask(color_list: list[str]) -> int:
+    """
+    Takes a lists of colours and combines it into a color mask.
+    """
+    return mana_cost_mask(''.join(color_list))
 
 
 def parse_color_list(color_list: list[str]) -> str:
     """
     Takes a lists of colours and combines it into a COLOR_STRING.
     """
-    color_str = ''.join(color_list)
-    return get_color_identity(color_str)
+    return IDENTITY_BY_MASK[color_list_mask(color_list)]
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+    from itertools import islice
+    from timeit import timeit
+
+    # Imported here, as card imports this module.
+    import core.game_concepts.card as card_module
+    from core.data.bulk import iter_bulk_json
+    from core.game_concepts.card import Card
+
+    # Benchmark: building cards from a bulk sample, with and without memoized color parsing.
+    #  Pass the path of a Scryfall bulk data file to sample it, otherwise a set's worth of cards is generated.
+    random.seed(0)
+    if len(sys.argv) > 1:
+        sample = list(islice(iter_bulk_json(sys.argv[1]), 30_000))
+    else:
+        def make_card_json(index: int) -> dict:
+            colors = random.choice(GROUP_COLOR_COMBINATIONS)
+            return {
+                'id': str(index), 'set': 'blb', 'collector_number': str(index), 'name': f"Card {index}",
+                'rarity': 'common', 'layout': 'normal', 'cmc': len(colors) + 2, 'type_line': 'Creature — Bear',
+                'mana_cost': f"{{{random.randint(1, 6)}}}" + ''.join(f"{{{c}}}" for c in colors),
+                'colors': list(colors), 'color_identity': list(colors), 'image_uris': {'large': ''},
+            }
+        sample = [make_card_json(i) for i in range(300)] * 100
+
+    def unmemoized_color_list_mask(color_list: list[str]) -> int:
+        return mana_cost_mask.__wrapped__(''.join(color_list))
+
+    memoized = timeit(lambda: [Card(data) for data in sample], number=3)
+    card_module.mana_cost_mask, card_module.color_list_mask = mana_cost_mask.__wrapped__, unmemoized_color_list_mask
+    unmemoized = timeit(lambda: [Card(data) for data in sample], number=3)
+    print(f"{len(sample)} cards: unmemoized {unmemoized:.3f}s, memoized color parsing {memoized:.3f}s")
@@ -0,0 +1,139 @@
+from typing import Optional
+
+import asyncio
+import glob
+import logging
+import os
+from time import perf_counter
+
+from core.data.caching import CardCache
+from core.data.config import SetGeneratorConfig
+from core.data.set_context import SetContext
+from core.data.snapshot import SnapshotMismatchError, snapshot_path
+from core.game_concepts.card import Card
+from core.generators.build import ArtifactTiming, SetReviewBuild, deck_executor, print_timings, write_metrics
+from core.generators.powerpoint import CardImagePrefetcher
+from core.metrics import METRICS
+from definitions import CONFIG_DIR, ROOT_DIR
+
+
+def discover_configs(config_dir: str = CONFIG_DIR) -> list[str]:
+    """
+    Finds every set config in a folder.
+    :param config_dir: The folder to look in.
+    :return: The paths of the configs, sorted by file name.
+    """
+    return sorted(glob.glob(os.path.join(config_dir, "*.json")))
+
+
+async def _search_all(queries: list[str]) -> dict[str, dict[str, Card]]:
+    card_cache = CardCache()
+    results = await asyncio.gather(*(card_cache.search_async(query) for query in queries))
+    return dict(zip(queries, results))
+
+
+class BatchBuild:
+    """
+    Builds the documents for every configured set as a single job.
+
+    Sets with a usable snapshot are loaded from it. The queries of all the other sets are searched together,
+    with each distinct query only searched once, however many sets share it. The images for every deck
+    are then downloaded once into the image cache, and all the decks are built through one shared pool
+    of processes, while the grade sheets are written in this process.
+    Documents whose cards and images haven't changed since they were last built are skipped.
+    """
+    DEFAULT_MAX_PROCESSES = max(1, (os.cpu_count() or 2) // 2)
+
+    configs: dict[str, SetGeneratorConfig]
+    max_processes: int
+    max_age: Optional[float]
+    force: bool
+
+    def __init__(self, config_paths: Optional[list[str]] = None, max_processes: int = DEFAULT_MAX_PROCESSES,
+                 max_age: Optional[float] = SetContext.DEFAULT_SNAPSHOT_MAX_AGE, force: bool = False):
+        """
+        :param config_paths: The configs of the sets to build. Defaults to every config in `CONFIG_DIR`.
+        :param max_processes: How many decks to build at once.
+        :param max_age: How old a set's snapshot can be before it is searched again, in seconds.
+        :param force: Whether to rebuild documents even if their inputs haven't changed.
+        """
+        paths = config_paths if config_paths is not None else discover_configs()
+        self.configs = {path: SetGeneratorConfig.load_json(path) for path in paths}
+        self.max_processes = max(1, max_processes)
+        self.max_age = max_age
+        self.force = force
+
+    def load_set_contexts(self) -> dict[str, SetContext]:
+        """
+        Loads every configured set, searching only the distinct queries of the sets without a usable snapshot.
+        :return: The set context for each config path.
+        """
+        set_contexts = dict()
+        pending = list()
+        for path, config in self.configs.items():
+            set_config = config.set_context
+            try:
+                set_contexts[path] = SetContext.from_snapshot(
+                    snapshot_path(set_config.set_code), set_config.set_code, set_config.bonus_set_code,
+                    *set_config.scryfall_queries, max_age=self.max_age
+                )
+            except (OSError, SnapshotMismatchError) as e:
+                logging.info(f"Searching for '{set_config.set_code}': {e}")
+                pending.append(path)
+
+        queries = list(dict.fromkeys(
+            query for path in pending for query in self.configs[path].set_context.scryfall_queries
+        ))
+        results = asyncio.run(_search_all(queries)) if queries else dict()
+
+        for path in pending:
+            set_config = self.configs[path].set_context
+            set_context = SetContext.from_search_results(
+                set_config.set_code, set_config.bonus_set_code, tuple(set_config.scryfall_queries), results
+            )
+            set_context.save_snapshot()
+            set_contexts[path] = set_context
+        return set_contexts
+
+    def build(self) -> dict[str, list[ArtifactTiming]]:
+        """
+        Builds every set's documents.
+        :return: How long each document took, by set code.
+        """
+        with METRICS.span('batch.load'):
+            set_contexts = self.load_set_contexts()
+        builds = {
+            path: SetReviewBuild(set_context, SetGeneratorConfig.output_dir(self.configs[path]),
+                                 self.configs[path].document_context.reviewers, force=self.force)
+            for path, set_context in set_contexts.items()
+        }
+
+        # Download the images of every deck to be built in one go, so images shared between sets are only fetched once.
+        all_cards = [card for build in builds.values() for plan in build.stale_decks.values() for card in plan.cards]
+        with METRICS.span('batch.download'):
+            downloaded = CardImagePrefetcher().download(all_cards)
+        logging.info(f"Downloaded {downloaded} images for {len(all_cards)} cards")
+
+        timings = dict()
+        with deck_executor(self.max_processes) as executor:
+            futures = {path: build.submit_decks(executor) for path, build in builds.items()}
+            spreadsheets = {path: build.write_spreadsheet() for path, build in builds.items()}
+            for path, build in builds.items():
+                timings[build.set_context.set_code] = [spreadsheets[path]] + build.finish(futures[path])
+        return timings
+
+
+def main(config_paths: Optional[list[str]] = None, force: bool = False) -> dict[str, list[ArtifactTiming]]:
+    start = perf_counter()
+    with METRICS.span('batch'):
+        timings = BatchBuild(config_paths, force=force).build()
+    for set_code, set_timings in timings.items():
+        print(f"\n{set_code}:")
+        print_timings(set_timings, sum(timing.seconds for timing in set_timings))
+    print(f"\nBuilt {len(timings)} sets in {perf_counter() - start:.1f}s")
+    write_metrics(os.path.join(ROOT_DIR, "Generated Documents"))
+    return timings
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+from typing import Any, Optional, NamedTuple
+
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, Future
+from time import perf_counter
+
+from core.data.rate_limiting import SCRYFALL_RATE_LIMITER
+from core.data.set_context import SetContext
+from core.game_concepts.card import Card
+from core.generators.excel import ExcelGenerator
+from core.generators.manifest import BuildManifest
+from core.generators.powerpoint import CardImagePrefetcher, DeckPlan, ImageEncoder, PowerPointGenerator, write_deck
+from core.metrics import METRICS
+
+METRICS_FILE_NAME = "build-metrics.json"
+TRACE_FILE_NAME = "build-trace.json"
+
+
+class ArtifactTiming(NamedTuple):
+    file_name: str
+    seconds: float
+    # Whether the document was left as it was, because its inputs hadn't changed.
+    skipped: bool = False
+
+
+def _init_deck_worker(requests_per_second: float, metrics_enabled: bool) -> None:
+    # Each worker process has its own rate limiter, so they split Scryfall's allowance between them.
+    SCRYFALL_RATE_LIMITER.rate = requests_per_second
+    if metrics_enabled:
+        METRICS.enable()
+
+
+def _build_deck(file_name: str, output_dir: str, cards: list[Card], encoder: ImageEncoder, max_workers: int,
+                slides: list[str], previous_slides: Optional[list[str]]) -> tuple[float, Optional[dict[str, Any]]]:
+    """
+    Builds one deck, in a worker process.
+    :return: How long the deck took to build, in seconds, and the metrics recorded while building it, if enabled.
+    """
+    start = perf_counter()
+    prefetcher = CardImagePrefetcher(max_workers, encoder=encoder)
+    write_deck(file_name, output_dir, cards, prefetcher, slides, previous_slides)
+    elapsed = perf_counter() - start
+    if not METRICS.enabled:
+        return elapsed, None
+
+    # Workers are reused between decks, so each deck hands back only its own metrics.
+    exported = METRICS.export()
+    METRICS.reset()
+    return elapsed, exported
+
+
+def deck_executor(max_processes: int) -> ProcessPoolExecutor:
+    """
+    Creates a pool of processes to build decks in.
+    :param max_processes: How many decks to build at once.
+    :return: The pool.
+    """
+    # Spawned workers start from a clean interpreter, rather than a copy of this process's sessions and locks.
+    context = multiprocessing.get_context('spawn')
+    requests_per_second = SCRYFALL_RATE_LIMITER.rate / max_processes
+    return ProcessPoolExecutor(max_processes, context, _init_deck_worker, (requests_per_second, METRICS.enabled))
+
+
+class SetReviewBuild:
+    """
+    Builds every document for a set review from a single `SetContext`, at the same time.
+
+    The cards are ordered once, up front. Each deck is then built in a separate process, since decoding, compositing
+    and saving slides is CPU bound, while the grade sheet is written in this process as the decks are built.
+    Documents whose inputs are unchanged since the last build into the same folder are skipped,
+    and decks only re-render the slides that changed, where they can.
+
+    Each worker has its own prefetcher, so identical images are only stored once within a deck, never across decks.
+    Images are shared between workers through the on-disk image cache, which is filled before the decks are built.
+    """
+    set_context: SetContext
+    output_dir: str
+    powerpoints: PowerPointGenerator
+    spreadsheet: ExcelGenerator
+    max_workers: int
+    force: bool
+    manifest: BuildManifest
+    _deck_plans: Optional[dict[str, DeckPlan]]
+
+    def __init__(self, set_context: SetContext, output_dir: str, reviewers: list[str],
+                 encoder: Optional[ImageEncoder] = None,
+                 max_workers: int = CardImagePrefetcher.DEFAULT_MAX_WORKERS,
+                 force: bool = False):
+        """
+        :param set_context: The set to build documents for.
+        :param output_dir: The folder to write the documents to.
+        :param reviewers: The reviewers to give columns on the grade sheet.
+        :param encoder: How to encode the slide images.
+        :param max_workers: How many images each deck downloads and encodes at once.
+        :param force: Whether to rebuild documents even if their inputs haven't changed.
+        """
+        self.set_context = set_context
+        self.output_dir = output_dir
+        self.powerpoints = PowerPointGenerator(set_context, max_workers, encoder)
+        self.spreadsheet = ExcelGenerator(set_context, reviewers)
+        self.max_workers = max_workers
+        self.force = force
+        self.manifest = BuildManifest.load(output_dir)
+        self._deck_plans = None
+
+    @property
+    def stale_decks(self) -> dict[str, DeckPlan]:
+        """The decks that have to be built, because they are missing or their inputs have changed."""
+        if self._deck_plans is None:
+            self._deck_plans = self.powerpoints.plan_decks(self.manifest, self.force)
+        return self._deck_plans
+
+    def submit_decks(self, executor: Executor) -> dict[str, Future]:
+        """
+        Queues the stale decks to be built.
+        :param executor: The pool to build them in, eg. from `deck_executor`.
+        :return: The future result of each deck, by file name.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        return {
+            file_name: executor.submit(_build_deck, file_name, self.output_dir, plan.cards,
+                                       self.powerpoints.encoder, self.max_workers, plan.slides, plan.previous_slides)
+            for file_name, plan in self.stale_decks.items()
+        }
+
+    def write_spreadsheet(self) -> ArtifactTiming:
+        """Writes the grade sheet, unless it is up to date."""
+        start = perf_counter()
+        written = self.spreadsheet.generate_spreadsheet(self.output_dir, self.force, self.manifest)
+        return ArtifactTiming(self.spreadsheet.file_name, perf_counter() - start, skipped=not written)
+
+    def finish(self, futures: dict[str, Future]) -> list[ArtifactTiming]:
+        """
+        Waits for the decks to be built, and records them in the manifest.
+        :param futures: The futures returned by `submit_decks`.
+        :return: How long each deck took, including those that were skipped.
+        """
+        timings = list()
+        try:
+            for file_name in self.powerpoints.decks:
+                future = futures.get(file_name)
+                if future is None:
+                    timings.append(ArtifactTiming(file_name, 0.0, skipped=True))
+                    continue
+
+                seconds, exported = future.result()
+                if exported:
+                    METRICS.merge(exported)
+                timings.append(ArtifactTiming(file_name, seconds))
+                plan = self.stale_decks[file_name]
+                self.manifest.record(file_name, plan.fingerprint, plan.slides)
+                print(f"Created file '{file_name}'!")
+        finally:
+            # Keep whatever was built, even if another deck failed.
+            self.manifest.save()
+        return timings
+
+    def build(self, executor: Optional[Executor] = None) -> list[ArtifactTiming]:
+        """
+        Builds the decks and the grade sheet.
+        :param executor: The pool to build the decks in. If None, one is created for just this set.
+        :return: How long each document took.
+        """
+        if executor is None:
+            with deck_executor(len(self.powerpoints.decks)) as executor:
+                return self.build(executor)
+
+        futures = self.submit_decks(executor)
+        spreadsheet_timing = self.write_spreadsheet()
+        return [spreadsheet_timing] + self.finish(futures)
+
+
+def print_timings(timings: list[ArtifactTiming], elapsed: float) -> None:
+    for timing in timings:
+        status = "unchanged" if timing.skipped else f"{timing.seconds:7.1f}s"
+        print(f"{timing.file_name:45} {status:>9}")
+    print(f"{'Total':45} {elapsed:8.1f}s")
+
+
+def write_metrics(output_dir: str) -> None:
+    """
+    Writes the metrics recorded during a build, if they are enabled, as a JSON report and a Chrome trace.
+    :param output_dir: The folder to write them to.
+    """
+    if not METRICS.enabled:
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    METRICS.write_report(os.path.join(output_dir, METRICS_FILE_NAME))
+    METRICS.write_chrome_trace(os.path.join(output_dir, TRACE_FILE_NAME))
+    print(f"Wrote build metrics to '{output_dir}'")
+
+
+def build_set_review(set_context: SetContext, output_dir: str, reviewers: list[str],
+                     force: bool = False) -> list[ArtifactTiming]:
+    """
+    Builds every document for a set review, and prints how long each one took.
+    If metrics are enabled, they are written to the output folder too.
+    :param set_context: The set to build documents for.
+    :param output_dir: The folder to write the documents to.
+    :param reviewers: The reviewers to give columns on the grade sheet.
+    :param force: Whether to rebuild documents even if their inputs haven't changed.
+    :return: How long each document took.
+    """
+    start = perf_counter()
+    with METRICS.span('build', set=set_context.set_code):
+        timings = SetReviewBuild(set_context, output_dir, reviewers, force=force).build()
+    print_timings(timings, perf_counter() - start)
+    write_metrics(output_dir)
+    return timings
+
+
+def main(
+        expansion: str,
+        bonus_sheet: Optional[str],
+        reviewers: list[str],
+        *queries: str,
+        print_card_list: bool = False
+) -> list[ArtifactTiming]:
+    context = SetContext.from_snapshot_or_queries(expansion, bonus_sheet, *queries, print_card_list=print_card_list)
+    return build_set_review(context, os.path.join('../../Generated Documents', expansion.upper()), reviewers)
+
+
+if __name__ == "__main__":
+    REVIEWERS = ['Alex', 'Marc']
+
+    set_code = 'BLB'
+    bonus_set_code = None
+    scryfall_queries = [
+        "set:blb unique:cards cn<=261",
+        "(set:spg and date=blb) unique:cards",
+    ]
+
+    main(set_code, bonus_set_code, REVIEWERS, *scryfall_queries, print_card_list=False)
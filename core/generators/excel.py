@@ -2,19 +2,36 @@ from typing import Optional, Any
 
 import os
 from pathlib import Path
-import pandas as pd
+import xlsxwriter
 
 from core.data.set_context import SetContext
 from core.game_concepts.card import Card
+from core.generators.manifest import BuildManifest, card_fingerprint, fingerprint
+from core.metrics import METRICS
 
 
 class ExcelGenerator:
+    # The width of each column, in characters. Reviewer columns share `REVIEWER_COLUMN_WIDTH`.
+    COLUMN_WIDTHS = {
+        "Card Name": 36,
+        "Expansion": 10,
+        "Color": 8,
+        "Cost": 20,
+        "Rarity": 10,
+        "Type": 40,
+    }
+    REVIEWER_COLUMN_WIDTH = 12
+
     set_context: SetContext
 
     def __init__(self, set_context: SetContext, reviewers: list[str]):
         self.set_context = set_context
         self.reviewers = reviewers
 
+    @property
+    def columns(self) -> list[str]:
+        return ["Card Name", "Expansion"] + self.reviewers + ["Color", "Cost", "Rarity", "Type"]
+
     def gen_dict_from_card(self, card: Card) -> dict[str, Any]:
         sanitized_name = card.name.replace('"', '')
         mapping_dict = {
@@ -30,17 +47,67 @@ class ExcelGenerator:
         }
         return mapping_dict
 
-    def generate_spreadsheet(self, output_dir: str):
+    @property
+    def file_name(self) -> str:
+        return f"{self.set_context.set_code} - Grades.xlsx"
+
+    def input_fingerprint(self) -> str:
+        """A fingerprint of everything the grade sheet is built from."""
+        return fingerprint('spreadsheet', self.columns, self.COLUMN_WIDTHS, self.REVIEWER_COLUMN_WIDTH,
+                           [card_fingerprint(card) for card in self.set_context.sorted_card_list])
+
+    def generate_spreadsheet(self, output_dir: str, force: bool = False,
+                             manifest: Optional[BuildManifest] = None) -> bool:
+        """
+        Writes the grade sheet, streaming one row per card straight to the file.
+        The workbook is written in constant memory mode, so rows are flushed as they are written,
+        rather than the whole table being built up first.
+        The sheet is skipped if it was last written to the folder from the same cards and reviewers.
+        :param output_dir: The folder to write the spreadsheet to.
+        :param force: Whether to write the sheet even if its inputs haven't changed.
+        :param manifest: The folder's build manifest, if the caller saves it. Otherwise it is loaded and saved here.
+        :return: Whether the sheet was written.
+        """
+        file_name = self.file_name
+        sheet_manifest = manifest if manifest else BuildManifest.load(output_dir)
+        sheet_fingerprint = self.input_fingerprint()
+        if not force and sheet_manifest.is_current(file_name, sheet_fingerprint):
+            print(f"'{file_name}' is up to date")
+            return False
+
         path = Path(output_dir)
         path.mkdir(parents=True, exist_ok=True)
-        path.joinpath()
 
-        file_name = f"{self.set_context.set_code} - Grades.xlsx"
-        records = [self.gen_dict_from_card(card) for card in self.set_context.sorted_card_list]
-        frame = pd.DataFrame.from_records(records)
-        frame.to_excel(os.path.join(output_dir, file_name))
+        with METRICS.span('excel.write', file=file_name):
+            workbook = xlsxwriter.Workbook(os.path.join(output_dir, file_name), {'constant_memory': True})
+            try:
+                worksheet = workbook.add_worksheet("Grades")
+                header_format = workbook.add_format({'bold': True, 'bottom': 1})
+                link_format = workbook.add_format({'font_color': 'blue', 'underline': 1})
+
+                columns = self.columns
+                for column, heading in enumerate(columns):
+                    worksheet.set_column(column, column, self.COLUMN_WIDTHS.get(heading, self.REVIEWER_COLUMN_WIDTH))
+                    worksheet.write_string(0, column, heading, header_format)
+                worksheet.freeze_panes(1, 1)
+
+                row = 0
+                for row, card in enumerate(self.set_context.sorted_card_list, start=1):
+                    for column, (heading, value) in enumerate(self.gen_dict_from_card(card).items()):
+                        if heading == "Card Name":
+                            worksheet.write_formula(row, column, value, link_format, card.name.replace('"', ''))
+                        elif value:
+                            worksheet.write_string(row, column, value)
+                worksheet.autofilter(0, 0, row, len(columns) - 1)
+            finally:
+                workbook.close()
         print(f"Created file '{file_name}'!")
 
+        sheet_manifest.record(file_name, sheet_fingerprint)
+        if manifest is None:
+            sheet_manifest.save()
+        return True
+
     @property
     def sorted_card_list(self) -> list[Card]:
         return self.set_context.sorted_card_list
@@ -53,7 +120,7 @@ def main(
         *queries: str,
         print_card_list: bool = False
 ) -> ExcelGenerator:
-    context = SetContext.from_queries(expansion, bonus_sheet, *queries, print_card_list=print_card_list)
+    context = SetContext.from_snapshot_or_queries(expansion, bonus_sheet, *queries, print_card_list=print_card_list)
     generator = ExcelGenerator(context, reviewers)
     generator.generate_spreadsheet(os.path.join('../../Generated Documents', expansion.upper()))
     return generator
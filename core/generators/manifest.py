@@ -0,0 +1,99 @@
+from typing import Any, Optional
+
+import json
+import logging
+import os
+from hashlib import sha256
+
+from core.game_concepts.card import Card
+
+MANIFEST_FILE_NAME = ".build-manifest.json"
+
+# Bump whenever a generator's output changes for the same inputs, so everything is rebuilt once.
+MANIFEST_VERSION = 3
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Hashes the inputs of an artifact into a short, stable fingerprint.
+    :param parts: JSON serializable values that the artifact depends on.
+    :return: The hex digest of the inputs.
+    """
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def card_fingerprint(card: Card) -> tuple:
+    """
+    Gets the parts of a card that the documents depend on.
+    Images are identified by their urls, which Scryfall stamps with a version that changes along with the image,
+    so nothing has to be downloaded or read to tell whether a card has changed.
+    :param card: The card.
+    :return: The card's data, as a JSON serializable tuple.
+    """
+    return (
+        card.scryfall_id, card.full_name, card.expansion, card.number, card.rarity, card.mana_cost,
+        card.type_line, card.casting_identity, card.front_image_url, card.back_image_url,
+    )
+
+
+class BuildManifest:
+    """
+    Records the fingerprint of the inputs each document in an output folder was built from,
+    so that documents whose inputs haven't changed can be skipped on the next build.
+    Documents made of parts, such as the slides of a deck, also record a fingerprint per part,
+    so that only the parts that changed have to be rebuilt.
+    """
+    output_dir: str
+    _entries: dict[str, dict[str, Any]]
+
+    @classmethod
+    def load(cls, output_dir: str):
+        manifest = cls(output_dir)
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                manifest._entries = dict(data['artifacts'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logging.warning(f"Ignoring unreadable build manifest '{manifest.path}': {e}")
+        return manifest
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self._entries = dict()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.output_dir, MANIFEST_FILE_NAME)
+
+    def _exists(self, file_name: str) -> bool:
+        return file_name in self._entries and os.path.exists(os.path.join(self.output_dir, file_name))
+
+    def is_current(self, file_name: str, artifact_fingerprint: str) -> bool:
+        """
+        Checks whether a document exists, and was built from the same inputs.
+        :param file_name: The document's file name, within the output folder.
+        :param artifact_fingerprint: The fingerprint of the inputs it would be built from now.
+        :return: Whether the document can be skipped.
+        """
+        return self._exists(file_name) and self._entries[file_name]['fingerprint'] == artifact_fingerprint
+
+    def parts(self, file_name: str) -> Optional[list[str]]:
+        """
+        Gets the fingerprints of the parts of a document, as it was last built.
+        :param file_name: The document's file name, within the output folder.
+        :return: The fingerprint of each part, or None if the document doesn't exist.
+        """
+        return self._entries[file_name].get('parts') if self._exists(file_name) else None
+
+    def record(self, file_name: str, artifact_fingerprint: str, parts: Optional[list[str]] = None) -> None:
+        self._entries[file_name] = {'fingerprint': artifact_fingerprint, 'parts': parts}
+
+    def save(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(f"{self.path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'artifacts': self._entries}, f, indent=2, sort_keys=True)
+        os.replace(f"{self.path}.tmp", self.path)
@@ -1,16 +1,100 @@
-from typing import Optional, Iterable
+from __future__ import annotations
+
+from typing import Optional, Iterable, Iterator, NamedTuple, Union
 import os
+from hashlib import sha1
 from pathlib import Path
-import tempfile
+from io import BytesIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import islice
 
 from pptx import Presentation as NewPresentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.image import Image as PptxImage, ImagePart
+from pptx.enum.shapes import MSO_SHAPE_TYPE
 from pptx.util import Cm
 from pptx.presentation import Presentation
-from PIL.Image import Image
+from pptx.slide import Slide
+from PIL.Image import Image, open as open_image
 
 from core.data.caching import CardCache
+from core.data.config import SetGeneratorConfig
+from core.data.image_cache import IMAGE_CACHE
 from core.data.set_context import SetContext
 from core.game_concepts.card import Card
+from core.generators.manifest import BuildManifest, card_fingerprint, fingerprint
+from core.metrics import METRICS
+from definitions import CONFIG_DIR
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    size: tuple[int, int]
+    # The SHA1 of `data`, which is how python-pptx identifies identical images.
+    digest: str
+
+    @classmethod
+    def from_bytes(cls, data: bytes, size: tuple[int, int]) -> EncodedImage:
+        return cls(data, size, sha1(data).hexdigest())
+
+
+class ImageEncoder:
+    """
+    Encodes slide images in memory, in a configurable format.
+    With `passthrough` set, a card image that needs no rotating or merging is embedded as the exact bytes
+    Scryfall served, without being decoded and encoded again.
+    """
+    image_format: str
+    quality: int
+    passthrough: bool
+
+    def __init__(self, image_format: str = 'JPEG', quality: int = 90, passthrough: bool = True):
+        """
+        :param image_format: The PIL format to encode images with, such as 'JPEG' or 'PNG'.
+        :param quality: The quality to encode JPEG images at, from 1 to 95.
+        :param passthrough: Whether to reuse Scryfall's original image bytes, when possible.
+        """
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.passthrough = passthrough
+
+    @property
+    def settings(self) -> tuple[str, int, bool]:
+        return self.image_format, self.quality, self.passthrough
+
+    def encode(self, image: Image) -> EncodedImage:
+        """
+        Encodes an image into a buffer in memory.
+        :param image: The image to encode.
+        :return: The encoded bytes, and the size of the image.
+        """
+        options = dict()
+        if self.image_format == 'JPEG':
+            options['quality'] = self.quality
+            if image.mode not in {'RGB', 'L'}:
+                image = image.convert('RGB')
+
+        buffer = BytesIO()
+        with METRICS.span('image.encode'):
+            image.save(buffer, format=self.image_format, **options)
+        return EncodedImage.from_bytes(buffer.getvalue(), image.size)
+
+    def encode_card(self, card: Card) -> EncodedImage:
+        """
+        Gets the encoded full image for a card, reusing Scryfall's bytes if passthrough allows it.
+        :param card: The card to encode the image of.
+        :return: The encoded bytes, and the size of the image.
+        """
+        if self.passthrough:
+            data = card.original_image_data
+            if data is not None:
+                METRICS.increment('image.passthrough')
+                # Opening an image only reads its header, so this gets the size without decoding it.
+                with open_image(BytesIO(data)) as image:
+                    return EncodedImage.from_bytes(data, image.size)
+
+        return self.encode(card.full_card_image)
 
 
 class ImageSetPowerpoint:
@@ -22,27 +106,92 @@ class ImageSetPowerpoint:
     MINIMUM_MARGIN = 2
 
     presentation: Optional[Presentation]
+    encoder: ImageEncoder
+    _image_parts: dict[str, ImagePart]
+    # How many slides use each image part, by digest, so parts no slide uses any more can be forgotten.
+    _image_part_uses: dict[str, int]
 
     @classmethod
-    def from_image_list(cls, file_name: str, output_dir: str, images: Iterable[Image]):
-        generator = cls(file_name, output_dir)
+    def from_image_list(cls, file_name: str, output_dir: str, images: Iterable[Union[Image, EncodedImage]],
+                        encoder: Optional[ImageEncoder] = None):
+        generator = cls(file_name, output_dir, encoder)
         for image in images:
             generator.add_centered_image_slide(image)
         return generator.create_powerpoint()
 
-    def __init__(self, file_name: str, output_dir: str):
-        self.presentation = NewPresentation()
+    @classmethod
+    def from_existing(cls, file_name: str, output_dir: str, encoder: Optional[ImageEncoder] = None):
+        """
+        Opens a presentation that was saved before, so its slides can be changed in place.
+        """
+        return cls(file_name, output_dir, encoder, open_existing=True)
+
+    def __init__(self, file_name: str, output_dir: str, encoder: Optional[ImageEncoder] = None,
+                 open_existing: bool = False):
         self.file_name = file_name
         self.output_dir = output_dir
+        self.encoder = encoder if encoder else ImageEncoder()
+        self._image_parts = dict()
+        self._image_part_uses = dict()
+        if open_existing:
+            self.presentation = NewPresentation(os.path.join(output_dir, file_name))
+            for slide in self.presentation.slides:
+                for relationship in slide.part.rels.values():
+                    if not relationship.is_external and isinstance(relationship.target_part, ImagePart):
+                        digest = relationship.target_part.sha1
+                        self._image_parts[digest] = relationship.target_part
+                        self._image_part_uses[digest] = self._image_part_uses.get(digest, 0) + 1
+        else:
+            self.presentation = NewPresentation()
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
 
     def create_powerpoint(self):
         file_path = os.path.join(self.output_dir, self.file_name)
         print(f"Saving to: {file_path}")
-        self.presentation.save(file_path)
+        with METRICS.span('pptx.save', file=self.file_name):
+            self.presentation.save(file_path)
         return self.presentation
 
-    def add_centered_image_slide(self, image: Image):
+    def add_centered_image_slide(self, image: Union[Image, EncodedImage]):
+        blank_slide_layout = self.presentation.slide_layouts[6]
+        with METRICS.span('pptx.add_slide'):
+            slide = self.presentation.slides.add_slide(blank_slide_layout)
+            self._add_centered_image(slide, image)
+
+    def replace_slide_image(self, index: int, image: Union[Image, EncodedImage]):
+        """
+        Replaces the picture on a slide with another image, centering it as `add_centered_image_slide` does.
+        :param index: The position of the slide in the presentation.
+        :param image: The new image.
+        """
+        slide = self.presentation.slides[index]
+        for shape in list(slide.shapes):
+            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+                relationship_id = shape._element.blip_rId
+                image_part = slide.part.related_part(relationship_id)
+                shape._element.getparent().remove(shape._element)
+                # Drops the relationship once nothing on the slide uses it, so an unused image isn't saved.
+                slide.part.drop_rel(relationship_id)
+                if relationship_id not in slide.part.rels:
+                    self._release_image_part(image_part)
+        self._add_centered_image(slide, image)
+
+    def _release_image_part(self, image_part: ImagePart):
+        """
+        Forgets an image part once no slide uses it. It won't be saved, and python-pptx may give its part name
+        to a new image, so reusing it for a later slide would write two images under the same name.
+        :param image_part: The image part a slide stopped using.
+        """
+        digest = image_part.sha1
+        self._image_part_uses[digest] -= 1
+        if not self._image_part_uses[digest]:
+            del self._image_part_uses[digest]
+            del self._image_parts[digest]
+
+    def _add_centered_image(self, slide: Slide, image: Union[Image, EncodedImage]):
+        if isinstance(image, Image):
+            image = self.encoder.encode(image)
+
         image_width = (image.size[0] / self.SCRYFALL_DPI) * self.INCH_TO_CM
         image_height = (image.size[1] / self.SCRYFALL_DPI) * self.INCH_TO_CM
         width_ratio = image_width / (self.SLIDE_WIDTH - self.MINIMUM_MARGIN * 2)
@@ -59,45 +208,196 @@ class ImageSetPowerpoint:
         x_position = (self.SLIDE_WIDTH - new_image_width) / 2
         y_position = (self.SLIDE_HEIGHT - new_image_height) / 2
 
-        temporary_image_file = tempfile.NamedTemporaryFile(suffix=".png")
-        image.save(temporary_image_file)
-
-        blank_slide_layout = self.presentation.slide_layouts[6]
-        slide = self.presentation.slides.add_slide(blank_slide_layout)
-        slide.shapes.add_picture(
-            temporary_image_file, Cm(x_position), Cm(y_position), width=Cm(new_image_width), height=Cm(new_image_height)
+        image_part = self._get_or_add_image_part(image)
+        relationship_id = slide.part.relate_to(image_part, RT.IMAGE)
+        self._image_part_uses[image.digest] = self._image_part_uses.get(image.digest, 0) + 1
+        slide.shapes._add_pic_from_image_part(
+            image_part, relationship_id,
+            Cm(x_position), Cm(y_position), Cm(new_image_width), Cm(new_image_height)
         )
 
+    def _get_or_add_image_part(self, image: EncodedImage) -> ImagePart:
+        """
+        Gets the image part holding an image, adding one if the presentation doesn't have it yet,
+        so identical pictures on different slides share a single copy in the file.
+
+        python-pptx does this itself in `add_picture`, but by hashing every image already in the package
+        each time a picture is added. Keeping our own index by digest makes each lookup constant time.
+        This goes through python-pptx internals, which is why requirements.txt pins its exact version.
+        :param image: The encoded image.
+        :return: The image part for it.
+        """
+        image_part = self._image_parts.get(image.digest)
+        if image_part is None:
+            image_part = ImagePart.new(self.presentation.part.package, PptxImage.from_blob(image.data))
+            self._image_parts[image.digest] = image_part
+        else:
+            METRICS.increment('pptx.image_parts_reused')
+        return image_part
+
+
+class CardImagePrefetcher:
+    """
+    Downloads, composes and encodes card images on a pool of worker threads, ahead of the slide writer.
+    Images are still yielded in the order of the cards, and at most `lookahead` of them are held at once.
+    Downloads go through the shared Scryfall rate limiter, so adding workers never breaks its request spacing.
+    """
+    DEFAULT_MAX_WORKERS = 8
+
+    max_workers: int
+    lookahead: int
+    encoder: ImageEncoder
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, lookahead: Optional[int] = None,
+                 encoder: Optional[ImageEncoder] = None):
+        self.max_workers = max(1, max_workers)
+        self.lookahead = lookahead if lookahead else self.max_workers * 2
+        self.encoder = encoder if encoder else ImageEncoder()
+
+    def _encode_image(self, card: Card) -> EncodedImage:
+        try:
+            return self.encoder.encode_card(card)
+        finally:
+            # Only the encoded bytes are needed for the slide, so the decoded pixels can be freed straight away.
+            card.release_images()
+
+    def download(self, cards: Iterable[Card]) -> int:
+        """
+        Downloads the face images of cards into the image cache, without decoding them.
+        Each distinct url is only fetched once, however many cards share it.
+        :param cards: The cards to download images for.
+        :return: How many images were downloaded.
+        """
+        urls = list(dict.fromkeys(url for card in cards for url in card.image_urls if url not in IMAGE_CACHE))
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for _ in executor.map(Card.get_face_image_data, urls):
+                pass
+        return len(urls)
+
+    def images(self, cards: Iterable[Card]) -> Iterator[EncodedImage]:
+        """
+        Yields the encoded full image of each card.
+        :param cards: The cards to get images for.
+        :return: The images, in the order of the cards.
+        """
+        card_iter = iter(cards)
+        pending: deque[Future[EncodedImage]] = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image-prefetch")
+
+        def submit(count: int) -> None:
+            for card in islice(card_iter, count):
+                pending.append(executor.submit(self._encode_image, card))
+
+        try:
+            submit(self.lookahead)
+            while pending:
+                yield pending.popleft().result()
+                submit(1)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def write_deck(file_name: str, output_dir: str, cards: list[Card], prefetcher: CardImagePrefetcher,
+               slides: Optional[list[str]] = None, previous_slides: Optional[list[str]] = None) -> int:
+    """
+    Writes a deck with one slide per card. If the deck was built before with the same number of slides,
+    only the slides whose fingerprints have changed are rendered again, and the rest of the file is kept.
+    :param file_name: The deck's file name.
+    :param output_dir: The folder to write the deck to.
+    :param cards: The cards, in slide order.
+    :param prefetcher: Loads the slide images.
+    :param slides: The fingerprint of each slide.
+    :param previous_slides: The fingerprint of each slide in the existing deck, if there is one.
+    :return: How many slides were rendered.
+    """
+    with METRICS.span('deck', file=file_name):
+        if slides is not None and previous_slides is not None and len(slides) == len(previous_slides):
+            changed = [index for index, (slide, previous) in enumerate(zip(slides, previous_slides))
+                       if slide != previous]
+            deck = ImageSetPowerpoint.from_existing(file_name, output_dir, prefetcher.encoder)
+            for index, image in zip(changed, prefetcher.images([cards[index] for index in changed])):
+                deck.replace_slide_image(index, image)
+            deck.create_powerpoint()
+            return len(changed)
+
+        ImageSetPowerpoint.from_image_list(file_name, output_dir, prefetcher.images(cards), prefetcher.encoder)
+        return len(cards)
+
+
+class DeckPlan(NamedTuple):
+    cards: list[Card]
+    fingerprint: str
+    # The fingerprint of each slide, now and when the deck was last built.
+    slides: list[str]
+    previous_slides: Optional[list[str]]
+
 
 class PowerPointGenerator:
     set_context: SetContext
+    encoder: ImageEncoder
+    prefetcher: CardImagePrefetcher
 
     @classmethod
-    def create_set_review(cls, set_context: SetContext):
+    def create_set_review(cls, set_context: SetContext, output_dir: Optional[str] = None):
         generator = PowerPointGenerator(set_context)
         # TODO: Better handle output path logic.
-        generator.generate_powerpoints(os.path.join(f'../../Generated Documents', set_context.set_code.upper()))
+        if output_dir is None:
+            output_dir = os.path.join(f'../../Generated Documents', set_context.set_code.upper())
+        generator.generate_powerpoints(output_dir)
         return generator
 
-    def __init__(self, set_context: SetContext):
+    def __init__(self, set_context: SetContext, max_workers: int = CardImagePrefetcher.DEFAULT_MAX_WORKERS,
+                 encoder: Optional[ImageEncoder] = None):
         self.set_context = set_context
+        self.encoder = encoder if encoder else ImageEncoder()
+        self.prefetcher = CardImagePrefetcher(max_workers, encoder=self.encoder)
 
-    def generate_powerpoints(self, output_dir: str = '.'):
-        day_one_file_name = f"{self.set_context.set_code} - Commons and Uncommons.pptx"
-        ImageSetPowerpoint.from_image_list(
-            day_one_file_name,
-            output_dir,
-            (card.full_card_image for card in self.set_context.day_one_cards)
-        )
-        print(f"Created file '{day_one_file_name}'!")
-
-        day_two_file_name = f"{self.set_context.set_code} - Rares and Mythics.pptx"
-        ImageSetPowerpoint.from_image_list(
-            day_two_file_name,
-            output_dir,
-            (card.full_card_image for card in self.set_context.day_two_cards)
-        )
-        print(f"Created file '{day_two_file_name}'!")
+    @property
+    def decks(self) -> dict[str, list[Card]]:
+        set_code = self.set_context.set_code
+        return {
+            f"{set_code} - Commons and Uncommons.pptx": self.set_context.day_one_cards,
+            f"{set_code} - Rares and Mythics.pptx": self.set_context.day_two_cards,
+        }
+
+    def plan_decks(self, manifest: BuildManifest, force: bool = False) -> dict[str, DeckPlan]:
+        """
+        Works out which decks have to be built, by fingerprinting each slide's card, including its image urls,
+        along with the encoder settings, since changing those changes every slide.
+        :param manifest: The manifest of the folder the decks are built in.
+        :param force: Whether to rebuild every deck from scratch, even if its inputs haven't changed.
+        :return: The plan for each deck that is missing or out of date, by file name.
+        """
+        plans = dict()
+        for file_name, cards in self.decks.items():
+            with METRICS.span('pptx.fingerprint', file=file_name):
+                slides = [fingerprint(self.encoder.settings, card_fingerprint(card)) for card in cards]
+            deck_fingerprint = fingerprint('deck', slides)
+            if force:
+                plans[file_name] = DeckPlan(cards, deck_fingerprint, slides, None)
+            elif not manifest.is_current(file_name, deck_fingerprint):
+                plans[file_name] = DeckPlan(cards, deck_fingerprint, slides, manifest.parts(file_name))
+        return plans
+
+    def generate_powerpoints(self, output_dir: str = '.', force: bool = False):
+        """
+        Writes the day one and day two decks, skipping any whose cards and images haven't changed since they
+        were last written to the folder, and only rendering the changed slides of the others where possible.
+        :param output_dir: The folder to write the decks to.
+        :param force: Whether to rebuild every deck from scratch.
+        """
+        manifest = BuildManifest.load(output_dir)
+        plans = self.plan_decks(manifest, force)
+        for file_name in self.decks:
+            plan = plans.get(file_name)
+            if plan is None:
+                print(f"'{file_name}' is up to date")
+                continue
+
+            rendered = write_deck(file_name, output_dir, plan.cards, self.prefetcher, plan.slides, plan.previous_slides)
+            manifest.record(file_name, plan.fingerprint, plan.slides)
+            manifest.save()
+            print(f"Created file '{file_name}', rendering {rendered} of {len(plan.cards)} slides!")
 
     @property
     def sorted_card_list(self) -> list[Card]:
@@ -110,44 +410,29 @@ def main(
         *queries: str,
         print_card_list: bool = False
 ) -> PowerPointGenerator:
-    context = SetContext.from_queries(expansion, bonus_sheet, *queries, print_card_list=print_card_list)
+    context = SetContext.from_snapshot_or_queries(expansion, bonus_sheet, *queries, print_card_list=print_card_list)
     return PowerPointGenerator.create_set_review(context)
 
 
-def otj():
-    set_code = 'OTJ'
-    bonus_set_code = 'OTP'
-    scryfall_queries = [
-        'set:otj unique:cards',
-        'set:otp unique:cards',
-        'set:big unique:cards',
-        '(set:spg and date=otj) unique:cards'
-    ]
+def main_from_config(config_name: str) -> PowerPointGenerator:
+    """
+    Builds the decks for a set described by one of the configs in `CONFIG_DIR`.
+    :param config_name: The file name of the config, eg. 'OTJ.json'.
+    """
+    config = SetGeneratorConfig.load_json(os.path.join(CONFIG_DIR, config_name))
+    return PowerPointGenerator.create_set_review(SetContext.from_config(config), SetGeneratorConfig.output_dir(config))
+
 
-    main(set_code, bonus_set_code, *scryfall_queries, print_card_list=False)
+def otj():
+    main_from_config("OTJ.json")
 
 
 def mh3():
-    set_code = 'MH3'
-    bonus_set_code = None
-    scryfall_queries = [
-        "set:mh3 unique:cards",
-        "(set:spg and date=mh3) unique:cards",
-        "(game:paper) set:m3c t:legendary t:creature -is:reprint",
-    ]
-
-    main(set_code, bonus_set_code, *scryfall_queries, print_card_list=False)
+    main_from_config("MH3.json")
 
 
 def blb():
-    set_code = 'BLB'
-    bonus_set_code = None
-    scryfall_queries = [
-        "set:blb unique:cards cn<=261",
-        "(set:spg and date=blb) unique:cards",
-    ]
-
-    main(set_code, bonus_set_code, *scryfall_queries, print_card_list=False)
+    main_from_config("BLB.json")
 
 
 def debug():
@@ -178,7 +463,7 @@ def debug():
     ImageSetPowerpoint.from_image_list(
         file_name,
         output_dir,
-        (card.full_card_image for card in cards)
+        CardImagePrefetcher().images(cards)
     )
     print(f"Created file '{file_name}'!")
 
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from typing import Any
+
+import json
+import math
+import os
+import threading
+from time import perf_counter_ns
+
+# Set to a non-empty value to enable metrics as soon as they are imported, eg. `MTG_METRICS=1`.
+METRICS_ENV_VAR = "MTG_METRICS"
+
+
+class Histogram:
+    """
+    Summarises a stream of values, eg. latencies in seconds, in constant space.
+    Values are counted in power of two buckets, so percentiles are accurate to within a factor of two.
+    """
+    count: int
+    total: float
+    min: float
+    max: float
+    _buckets: dict[int, int]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buckets = dict()
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        exponent = math.frexp(value)[1] if value > 0 else -1075
+        self._buckets[exponent] = self._buckets.get(exponent, 0) + 1
+
+    def merge(self, other: Histogram) -> None:
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for exponent, count in other._buckets.items():
+            self._buckets[exponent] = self._buckets.get(exponent, 0) + count
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Estimates a percentile, as the upper bound of the bucket it falls in.
+        :param fraction: The percentile, from 0 to 1.
+        :return: The estimated value, or 0 if nothing has been observed.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for exponent in sorted(self._buckets):
+            seen += self._buckets[exponent]
+            if seen >= rank:
+                return min(self.max, math.ldexp(1, exponent))
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+        }
+
+
+class _NullSpan:
+    """Stands in for a span while metrics are disabled, so timing a block costs next to nothing."""
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('_metrics', 'name', 'args', '_start')
+
+    def __init__(self, metrics: Metrics, name: str, args: dict[str, Any]):
+        self._metrics = metrics
+        self.name = name
+        self.args = args
+        self._start = 0
+
+    def __enter__(self) -> _Span:
+        self._metrics._stack().append(self.name)
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end = perf_counter_ns()
+        stack = self._metrics._stack()
+        path = '/'.join(stack)
+        stack.pop()
+        self._metrics._record_span(self.name, path, self._start, end, self.args)
+
+
+class Metrics:
+    """
+    Counters, histograms and nested spans for seeing where a build's time goes.
+
+    Counters count events, such as requests, bytes or cache hits. Histograms summarise values, such as latencies.
+    Spans time a block of code, adding its duration to a histogram named after the span, and recording it for
+    a Chrome trace (load the file in chrome://tracing or https://ui.perfetto.dev). Spans nest per thread, and the
+    report also breaks their time down by their path, eg. 'deck/slide'.
+
+    While disabled, every call returns straight away, and `span` hands back a shared no-op context manager.
+    Hot paths that do extra work to measure something should check `enabled` first.
+    """
+    enabled: bool
+    counters: dict[str, float]
+    histograms: dict[str, Histogram]
+    span_paths: dict[str, Histogram]
+    trace_events: list[dict[str, Any]]
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = dict()
+            self.histograms = dict()
+            self.span_paths = dict()
+            self.trace_events = list()
+            self._origin = perf_counter_ns()
+
+    # region Recording
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        Adds to a counter.
+        :param name: The counter, eg. 'http.requests'.
+        :param value: How much to add.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Adds a value to a histogram.
+        :param name: The histogram, eg. 'rate_limiter.wait'.
+        :param value: The value, in seconds for timings.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def span(self, name: str, **args: Any) -> _Span | _NullSpan:
+        """
+        Times a block of code, eg. `with METRICS.span('pptx.save', file=file_name): ...`.
+        :param name: The span, which also names the histogram its durations are added to.
+        :param args: Details to attach to the span in the trace.
+        :return: A context manager.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def _stack(self) -> list[str]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = list()
+        return stack
+
+    def _record_span(self, name: str, path: str, start: int, end: int, args: dict[str, Any]) -> None:
+        seconds = (end - start) / 1e9
+        event = {
+            'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'ts': (start - self._origin) / 1e3, 'dur': (end - start) / 1e3,
+        }
+        if args:
+            event['args'] = {key: str(value) for key, value in args.items()}
+
+        with self._lock:
+            for histograms, key in [(self.histograms, name), (self.span_paths, path)]:
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = Histogram()
+                histogram.observe(seconds)
+            self.trace_events.append(event)
+    # endregion Recording
+
+    # region Reporting
+    def export(self) -> dict[str, Any]:
+        """Gets everything recorded so far, in a form that can be pickled and passed to `merge`."""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': dict(self.histograms),
+                'span_paths': dict(self.span_paths),
+                'trace_events': list(self.trace_events),
+                'origin': self._origin,
+            }
+
+    def merge(self, exported: dict[str, Any]) -> None:
+        """
+        Adds the metrics exported by another process, eg. a worker that built a deck.
+        :param exported: The result of that process' `export`.
+        """
+        # perf_counter is system-wide on the platforms we run on, so traces line up across processes.
+        offset = (exported['origin'] - self._origin) / 1e3
+        with self._lock:
+            for name, value in exported['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for own, theirs in [(self.histograms, exported['histograms']), (self.span_paths, exported['span_paths'])]:
+                for name, histogram in theirs.items():
+                    own.setdefault(name, Histogram()).merge(histogram)
+            self.trace_events.extend({**event, 'ts': event['ts'] + offset} for event in exported['trace_events'])
+
+    def report(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'counters': dict(sorted(self.counters.items())),
+                'histograms': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                'spans': {path: histogram.summary() for path, histogram in sorted(self.span_paths.items())},
+            }
+
+    def write_report(self, path: str) -> None:
+        """Writes the counters, histograms and per-path span timings as JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Writes the spans in Chrome's trace event format."""
+        with self._lock:
+            events = list(self.trace_events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    # endregion Reporting
+
+
+METRICS = Metrics(enabled=bool(os.environ.get(METRICS_ENV_VAR)))
@@ -3,3 +3,5 @@ import os
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 DOC_DIR = os.path.join(ROOT_DIR, "Generated Documents")
 CONFIG_DIR = os.path.join(ROOT_DIR, "Configs")
+CACHE_DIR = os.path.join(ROOT_DIR, "Cache")
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "Images")
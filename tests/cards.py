@@ -0,0 +1,38 @@
+"""Builds small, fake Scryfall card objects for tests, so no test needs the network."""
+from typing import Any, Iterable
+import itertools
+
+_ids = itertools.count()
+
+
+def card_json(name: str = 'Card', expansion: str = 'blb', number: Any = None, rarity: str = 'common',
+              mana_cost: str = '{1}{W}', cmc: float = 2, type_line: str = 'Creature — Mouse',
+              colors: Iterable[str] = ('W',), back_name: str = None, **extra) -> dict:
+    """
+    Creates the Scryfall data for a card. Each card gets a unique id, and by default a unique collector number.
+    :param back_name: If given, the card is a transforming double faced card with this back face.
+    :param extra: Any other fields, which replace the generated ones.
+    """
+    i = next(_ids)
+    data = {
+        'object': 'card', 'id': f'id-{i}', 'set': expansion, 'collector_number': str(number or i + 1),
+        'rarity': rarity, 'name': name, 'cmc': cmc, 'color_identity': list(colors), 'layout': 'normal',
+        'released_at': '2024-08-02', 'reprint': False, 'games': ['paper', 'arena'], 'keywords': [],
+    }
+    if back_name:
+        data['layout'] = 'transform'
+        data['name'] = f'{name} // {back_name}'
+        data['type_line'] = f'{type_line} // {type_line}'
+        data['card_faces'] = [
+            {'name': name, 'mana_cost': mana_cost, 'type_line': type_line, 'colors': list(colors),
+             'image_uris': {'large': f'https://cards.scryfall.io/large/front/{i}.jpg?1'}},
+            {'name': back_name, 'mana_cost': '', 'type_line': type_line, 'colors': list(colors),
+             'image_uris': {'large': f'https://cards.scryfall.io/large/back/{i}.jpg?1'}},
+        ]
+    else:
+        data.update({
+            'mana_cost': mana_cost, 'type_line': type_line, 'colors': list(colors),
+            'image_uris': {'large': f'https://cards.scryfall.io/large/front/{i}.jpg?1'},
+        })
+    data.update(extra)
+    return data
@@ -0,0 +1,27 @@
+import io
+
+import pytest
+from PIL import Image
+
+from core.data.image_cache import IMAGE_CACHE
+from core.game_concepts.card import Card
+
+
+@pytest.fixture
+def image_cache(tmp_path, monkeypatch):
+    """Points the shared image cache at an empty folder, so card images can be stored without the network."""
+    monkeypatch.setattr(IMAGE_CACHE, 'cache_dir', str(tmp_path / 'Images'))
+    monkeypatch.setattr(IMAGE_CACHE, '_index', None)
+    monkeypatch.setattr(IMAGE_CACHE, '_total_bytes', 0)
+    return IMAGE_CACHE
+
+
+def image_bytes(color: tuple[int, int, int], size: tuple[int, int] = (244, 340)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def store_images(card: Card, color: tuple[int, int, int]) -> None:
+    for url in card.image_urls:
+        IMAGE_CACHE.put(url, image_bytes(color))
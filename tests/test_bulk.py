@@ -0,0 +1,68 @@
+import gzip
+import json
+
+import pytest
+
+from core.data.bulk import in_expansions, iter_bulk_cards, iter_bulk_json
+from tests.cards import card_json
+
+
+@pytest.fixture
+def cards() -> list[dict]:
+    return [card_json(name=f'Card {i}', expansion='blb' if i % 2 else 'otj', oracle_text='"quoted", [braces]')
+            for i in range(12)]
+
+
+def write(path, text: str, compress: bool = False) -> str:
+    if compress:
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64, 1 << 20])
+def test_objects_split_across_chunks(tmp_path, cards, chunk_size):
+    path = write(tmp_path / 'cards.json', json.dumps(cards, indent=2))
+    assert list(iter_bulk_json(path, chunk_size)) == cards
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 1 << 20])
+def test_gzipped_file(tmp_path, cards, chunk_size):
+    path = write(tmp_path / 'cards.json.gz', json.dumps(cards), compress=True)
+    assert list(iter_bulk_json(path, chunk_size)) == cards
+
+
+@pytest.mark.parametrize('text', ['[]', '  [ \n ]  ', '[\r\n]'])
+def test_empty_array(tmp_path, text):
+    assert list(iter_bulk_json(write(tmp_path / 'empty.json', text), chunk_size=1)) == []
+
+
+def test_whitespace_and_separators_at_chunk_boundaries(tmp_path):
+    text = '[ {"a": 1} ,\n\n  {"b": [1, 2]}  ,{"c": "]"}\n]'
+    path = write(tmp_path / 'x.json', text)
+    for chunk_size in range(1, len(text) + 1):
+        assert list(iter_bulk_json(path, chunk_size)) == [{'a': 1}, {'b': [1, 2]}, {'c': ']'}]
+
+
+def test_not_an_array(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_bulk_json(write(tmp_path / 'object.json', '{"a": 1}')))
+
+
+def test_unclosed_array(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_bulk_json(write(tmp_path / 'open.json', '[{"a": 1}, '), chunk_size=3))
+
+
+def test_truncated_object(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_bulk_json(write(tmp_path / 'truncated.json', '[{"a": 1}, {"b": '), chunk_size=3))
+
+
+def test_iter_bulk_cards_filters_before_building(tmp_path, cards):
+    path = write(tmp_path / 'cards.json', json.dumps(cards + [{'object': 'token'}]))
+    found = list(iter_bulk_cards(path, in_expansions('BLB')))
+    assert [card.full_name for card in found] == [data['name'] for data in cards if data['set'] == 'blb']
+    assert all(card.expansion == 'BLB' for card in found)
@@ -0,0 +1,27 @@
+import pytest
+import requests
+
+from core.data.sessions import SCRYFALL_SESSION
+from core.game_concepts.card import Card
+from tests.conftest import image_bytes
+
+
+def response(status_code: int, content: bytes) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = content
+    return result
+
+
+def test_downloaded_images_are_cached(image_cache, monkeypatch):
+    data = image_bytes((10, 20, 30))
+    monkeypatch.setattr(SCRYFALL_SESSION, 'get', lambda url: response(200, data))
+    assert Card.get_face_image_data('https://cards.scryfall.io/large/front/a.jpg?1') == data
+    assert image_cache.get('https://cards.scryfall.io/large/front/a.jpg?1') == data
+
+
+def test_failed_downloads_raise(image_cache, monkeypatch):
+    monkeypatch.setattr(SCRYFALL_SESSION, 'get', lambda url: response(503, b'<html>Service Unavailable</html>'))
+    with pytest.raises(requests.HTTPError):
+        Card.get_face_image_data('https://cards.scryfall.io/large/front/b.jpg?1')
+    assert 'https://cards.scryfall.io/large/front/b.jpg?1' not in image_cache
@@ -0,0 +1,60 @@
+import pytest
+
+from core.game_concepts.card import Card
+from core.game_concepts.card_types import SUBTYPES, SUPERTYPES, TYPES, parse_type_line
+from tests.cards import card_json
+
+
+def split_and_intersect(type_line: str) -> tuple[set[str], set[str], set[str], set[str]]:
+    """How cards found their types before type lines were parsed, which the parser has to match."""
+    all_types = set(type_line.split()) - {'—', '//'}
+    return all_types, all_types & SUPERTYPES, all_types & TYPES, all_types & SUBTYPES
+
+
+@pytest.mark.parametrize('type_line', [
+    'Instant',
+    'Legendary Creature — Mouse Warrior',
+    'Artifact — Equipment',
+    'Legendary Enchantment Creature — God',
+    'Basic Snow Land — Forest',
+    'Legendary Planeswalker — Jace',
+    'Creature — Human // Creature — Werewolf',
+    'Enchantment — Saga // Enchantment Creature — Goblin Shaman',
+    'Kindred Instant — Faerie',
+    'Creature — Gnome Scientist',
+    'Sorcery — Adventure',
+    '',
+])
+def test_matches_splitting_and_intersecting(type_line):
+    parsed = parse_type_line(type_line)
+    all_types, supertypes, types, subtypes = split_and_intersect(type_line)
+    assert parsed.all_types == all_types
+    assert parsed.supertypes == supertypes
+    assert parsed.types == types
+    assert parsed.subtypes == subtypes
+
+
+def test_unknown_words_are_kept_as_other_types():
+    parsed = parse_type_line('Legendary Creature — Human Glorpwhistle')
+    assert parsed.subtypes == {'Human'}
+    assert parsed.other_types == {'Glorpwhistle'}
+
+
+def test_multi_word_subtypes_are_not_split():
+    parsed = parse_type_line('Legendary Creature — Time Lord Doctor')
+    assert parsed.subtypes == {'Time Lord', 'Doctor'}
+    assert parsed.other_types == frozenset()
+    assert parsed.all_types == {'Legendary', 'Creature', 'Time Lord', 'Doctor'}
+
+
+def test_faces_are_parsed_separately():
+    parsed = parse_type_line('Creature — Human // Creature — Werewolf')
+    assert [face.subtypes for face in parsed.faces] == [{'Human'}, {'Werewolf'}]
+    assert parsed.subtypes == {'Human', 'Werewolf'}
+
+
+def test_repeated_type_lines_are_shared():
+    first = Card(card_json(type_line='Creature — Mouse Soldier'))
+    second = Card(card_json(type_line='Creature — Mouse Soldier'))
+    assert first.type_info is second.type_info
+    assert first.subtypes == {'Mouse', 'Soldier'}
@@ -0,0 +1,24 @@
+import json
+import os
+
+from core.data.config import SetGeneratorConfig
+from definitions import ROOT_DIR
+
+
+def load(tmp_path, document_context: dict) -> SetGeneratorConfig:
+    path = tmp_path / 'BLB.json'
+    path.write_text(json.dumps({
+        'set_context': {'set_code': 'blb', 'scryfall_queries': ['e:blb']},
+        'document_context': document_context,
+    }))
+    return SetGeneratorConfig.load_json(str(path))
+
+
+def test_output_dir_defaults_to_generated_documents(tmp_path):
+    config = load(tmp_path, {'reviewers': []})
+    assert SetGeneratorConfig.output_dir(config) == os.path.join(ROOT_DIR, 'Generated Documents', 'BLB')
+
+
+def test_output_dir_uses_the_output_root(tmp_path):
+    config = load(tmp_path, {'reviewers': [], 'output_root': 'Reviews'})
+    assert SetGeneratorConfig.output_dir(config) == os.path.join(ROOT_DIR, 'Reviews', 'BLB')
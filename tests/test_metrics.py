@@ -0,0 +1,60 @@
+import json
+
+from core.metrics import Histogram, Metrics
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.increment('http.requests')
+    metrics.observe('http.latency', 0.5)
+    with metrics.span('deck'), metrics.span('pptx.save'):
+        pass
+    assert metrics.span('deck') is metrics.span('pptx.save')
+    assert metrics.report() == {'counters': {}, 'histograms': {}, 'spans': {}}
+
+
+def test_spans_nest_by_path():
+    metrics = Metrics(enabled=True)
+    with metrics.span('deck', file='a.pptx'):
+        for _ in range(3):
+            with metrics.span('pptx.add_slide'):
+                pass
+    metrics.increment('image_cache.hits', 2)
+
+    report = metrics.report()
+    assert report['counters'] == {'image_cache.hits': 2}
+    assert {path: summary['count'] for path, summary in report['spans'].items()} == \
+           {'deck': 1, 'deck/pptx.add_slide': 3}
+    assert report['histograms']['pptx.add_slide']['count'] == 3
+    assert [event['args'] for event in metrics.trace_events if 'args' in event] == [{'file': 'a.pptx'}]
+
+
+def test_merging_another_process(tmp_path):
+    worker = Metrics(enabled=True)
+    with worker.span('deck'):
+        worker.increment('http.requests')
+
+    metrics = Metrics(enabled=True)
+    metrics.increment('http.requests')
+    metrics.merge(worker.export())
+
+    assert metrics.counters['http.requests'] == 2
+    assert metrics.span_paths['deck'].count == 1
+
+    path = tmp_path / 'trace.json'
+    metrics.write_chrome_trace(str(path))
+    events = json.loads(path.read_text())['traceEvents']
+    assert [event['name'] for event in events] == ['deck']
+    assert events[0]['ph'] == 'X' and events[0]['dur'] >= 0
+
+
+def test_histogram_summary():
+    histogram = Histogram()
+    for value in [0.001, 0.002, 0.004, 0.1]:
+        histogram.observe(value)
+    summary = histogram.summary()
+    assert summary['count'] == 4
+    assert summary['min'] == 0.001 and summary['max'] == 0.1
+    # Percentiles are the upper bound of their power of two bucket.
+    assert 0.002 <= summary['p50'] <= 0.004
+    assert summary['p95'] == 0.1
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from core.data.caching import CardCache
+from core.data.set_context import SetContext
+from core.game_concepts.card import Card
+from core.game_concepts.colors import GROUP_COLOR_COMBINATIONS
+from core.game_concepts.ordering import RARITIES, BucketedOrdering, order, order_by_scanning
+from tests.cards import card_json
+
+EXPANSIONS = ['BLB', 'OTP', 'SPG', 'MH3', 'OTJ']
+
+
+def random_card(rng: random.Random, name: str) -> Card:
+    colors = rng.choice(GROUP_COLOR_COMBINATIONS)
+    is_land = not colors and rng.random() < 0.3
+    return Card(card_json(
+        name=name, expansion=rng.choice(EXPANSIONS).lower(), rarity=rng.choice(RARITIES + ['special']),
+        mana_cost='' if is_land else '{2}' + ''.join(f'{{{color}}}' for color in colors),
+        # A narrow range of cmcs makes for plenty of ties, which have to be broken by list position.
+        cmc=0 if is_land else rng.randint(0, 3), colors=list(colors),
+        type_line='Land' if is_land else rng.choice(['Creature — Bear', 'Instant']),
+    ))
+
+
+def random_cache(seed: int, size: int = 300) -> CardCache:
+    rng = random.Random(seed)
+    card_cache = CardCache()
+    for i in range(size):
+        card_cache._add_to_cache(random_card(rng, f'Card {i}'))
+    return card_cache
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('expansion, bonus_sheet', [('BLB', 'OTP'), ('BLB', None), ('SPG', None), ('OTJ', 'BLB')])
+def test_bucketed_ordering_matches_scanning(seed, expansion, bonus_sheet):
+    card_cache = random_cache(seed)
+    assert order(card_cache, expansion, bonus_sheet) == order_by_scanning(card_cache, expansion, bonus_sheet)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_adding_cards_matches_building_from_scratch(seed):
+    card_cache = random_cache(seed)
+    cards = card_cache.card_list()
+
+    ordering = BucketedOrdering(cards[:100])
+    for card in cards[100:]:
+        ordering.add(card)
+    assert ordering.order('BLB', 'OTP') == BucketedOrdering(cards).order('BLB', 'OTP')
+
+
+def test_replacing_a_card_keeps_its_position():
+    card_cache = random_cache(0)
+    ordering = BucketedOrdering(card_cache.card_list())
+
+    existing = next(card for card in card_cache.card_list('BLB') if card.rarity == 'common')
+    # The reprint costs more, so it moves within its bucket, but ties still break on the original list position.
+    replacement = Card(card_json(
+        name=existing.full_name, expansion='blb', rarity='common', cmc=existing.cmc + 1,
+        mana_cost=existing.mana_cost, type_line=existing.type_line, colors=list(existing.colors),
+    ))
+    card_cache._add_to_cache(replacement, overwrite=True)
+    ordering.add(replacement, existing)
+
+    day_one, day_two = ordering.order('BLB', 'OTP')
+    assert (day_one, day_two) == order_by_scanning(card_cache, 'BLB', 'OTP')
+    assert replacement in day_one and existing not in day_one
+
+
+def test_set_context_keeps_its_order_up_to_date():
+    rng = random.Random(1)
+    card_cache = random_cache(1, size=150)
+    set_context = SetContext('BLB', 'OTP', card_cache)
+    set_context.get_card_orders()
+
+    for i in range(150, 200):
+        card_cache._add_to_cache(random_card(rng, f'Card {i}'))
+    assert set_context.get_card_orders() == order_by_scanning(card_cache, 'BLB', 'OTP')
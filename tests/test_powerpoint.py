@@ -0,0 +1,132 @@
+import io
+import os
+import zipfile
+
+from PIL import Image
+from pptx import Presentation
+
+from core.data.caching import CardCache
+from core.data.set_context import SetContext
+from core.game_concepts.card import Card
+from core.generators.manifest import BuildManifest, card_fingerprint, fingerprint
+from core.generators.powerpoint import CardImagePrefetcher, EncodedImage, ImageEncoder, ImageSetPowerpoint, \
+    PowerPointGenerator, write_deck
+from tests.cards import card_json
+from tests.conftest import image_bytes, store_images
+
+COLORS = [(200, 20, 20), (20, 200, 20), (20, 20, 200)]
+
+
+def media_files(path: str) -> list[str]:
+    return [name for name in zipfile.ZipFile(path).namelist() if name.startswith('ppt/media/')]
+
+
+def slide_colors(path: str) -> list[tuple[int, ...]]:
+    presentation = Presentation(path)
+    return [Image.open(io.BytesIO(slide.shapes[0].image.blob)).getpixel((100, 100)) for slide in presentation.slides]
+
+
+def assert_close(actual: tuple[int, ...], expected: tuple[int, ...]) -> None:
+    # JPEG is lossy, so colors only come back approximately.
+    assert all(abs(a - e) < 16 for a, e in zip(actual, expected)), (actual, expected)
+
+
+def test_identical_images_share_one_part(tmp_path):
+    images = [EncodedImage.from_bytes(image_bytes(COLORS[i % 3]), (244, 340)) for i in range(30)]
+    ImageSetPowerpoint.from_image_list('deck.pptx', str(tmp_path), images)
+
+    path = os.path.join(tmp_path, 'deck.pptx')
+    assert len(media_files(path)) == 3
+    for i, color in enumerate(slide_colors(path)):
+        assert_close(color, COLORS[i % 3])
+
+
+def test_write_deck_from_cards(tmp_path, image_cache):
+    cards = [Card(card_json(name=f'Card {i}', back_name='Back' if i == 4 else None)) for i in range(9)]
+    for i, card in enumerate(cards):
+        store_images(card, COLORS[i % 3])
+
+    rendered = write_deck('deck.pptx', str(tmp_path), cards, CardImagePrefetcher(max_workers=2))
+
+    path = os.path.join(tmp_path, 'deck.pptx')
+    assert rendered == 9
+    assert len(Presentation(path).slides) == 9
+    # The double faced card is merged into a new image, and the rest reuse one part per distinct image.
+    assert len(media_files(path)) == 4
+
+
+def test_changed_slides_are_replaced_in_place(tmp_path, image_cache):
+    colors = [COLORS[0], COLORS[1], COLORS[2], COLORS[0]]
+    cards = [Card(card_json(name=f'Card {i}')) for i in range(4)]
+    for card, color in zip(cards, colors):
+        store_images(card, color)
+    slides = [fingerprint(card_fingerprint(card)) for card in cards]
+    write_deck('deck.pptx', str(tmp_path), cards, CardImagePrefetcher(), slides)
+
+    # A new printing of the second card, with the only copy of its image.
+    cards[1] = Card(card_json(name='Card 1'))
+    store_images(cards[1], (240, 240, 20))
+    new_slides = [fingerprint(card_fingerprint(card)) for card in cards]
+    rendered = write_deck('deck.pptx', str(tmp_path), cards, CardImagePrefetcher(), new_slides, slides)
+
+    path = os.path.join(tmp_path, 'deck.pptx')
+    assert rendered == 1
+    presentation = Presentation(path)
+    assert [len(slide.shapes) for slide in presentation.slides] == [1, 1, 1, 1]
+    for actual, expected in zip(slide_colors(path), [COLORS[0], (240, 240, 20), COLORS[2], COLORS[0]]):
+        assert_close(actual, expected)
+    # The replaced image is no longer referenced by any slide, so it isn't saved.
+    assert len(media_files(path)) == 3
+
+
+def test_unchanged_decks_are_skipped(tmp_path, image_cache):
+    card_cache = CardCache()
+    for i, rarity in enumerate(['common', 'uncommon', 'rare', 'mythic'] * 2):
+        card = Card(card_json(name=f'Card {i}', rarity=rarity))
+        store_images(card, COLORS[i % 3])
+        card_cache._add_to_cache(card)
+    set_context = SetContext('BLB', None, card_cache)
+
+    PowerPointGenerator(set_context).generate_powerpoints(str(tmp_path))
+    manifest = BuildManifest.load(str(tmp_path))
+    assert PowerPointGenerator(set_context).plan_decks(manifest) == {}
+
+    card_cache._add_to_cache(Card(card_json(name='New', rarity='rare')))
+    assert list(PowerPointGenerator(set_context).plan_decks(manifest)) == ['BLB - Rares and Mythics.pptx']
+
+
+def test_swapped_images_keep_distinct_parts(tmp_path, image_cache):
+    cards = [Card(card_json(name=f'Card {i}')) for i in range(3)]
+    for card, color in zip(cards, COLORS):
+        store_images(card, color)
+    slides = [fingerprint(card_fingerprint(card)) for card in cards]
+    write_deck('deck.pptx', str(tmp_path), cards, CardImagePrefetcher(), slides)
+
+    # The first slide gets a new image, and the second takes the image the first one had.
+    cards[0], cards[1] = Card(card_json(name='Card 0')), Card(card_json(name='Card 1'))
+    store_images(cards[0], (240, 240, 20))
+    store_images(cards[1], COLORS[0])
+    new_slides = [fingerprint(card_fingerprint(card)) for card in cards]
+    assert write_deck('deck.pptx', str(tmp_path), cards, CardImagePrefetcher(), new_slides, slides) == 2
+
+    path = os.path.join(tmp_path, 'deck.pptx')
+    names = zipfile.ZipFile(path).namelist()
+    assert len(names) == len(set(names))
+    assert len(media_files(path)) == 3
+    for actual, expected in zip(slide_colors(path), [(240, 240, 20), COLORS[0], COLORS[2]]):
+        assert_close(actual, expected)
+
+
+def test_changing_the_encoder_changes_every_slide(tmp_path, image_cache):
+    card_cache = CardCache()
+    for i, rarity in enumerate(['common', 'rare']):
+        card = Card(card_json(name=f'Card {i}', rarity=rarity))
+        store_images(card, COLORS[i])
+        card_cache._add_to_cache(card)
+    set_context = SetContext('BLB', None, card_cache)
+    PowerPointGenerator(set_context).generate_powerpoints(str(tmp_path))
+
+    plans = PowerPointGenerator(set_context, encoder=ImageEncoder('PNG')).plan_decks(BuildManifest.load(str(tmp_path)))
+    assert len(plans) == 2
+    for plan in plans.values():
+        assert all(slide != previous for slide, previous in zip(plan.slides, plan.previous_slides))
@@ -0,0 +1,120 @@
+import pytest
+
+from core.data.query import LocalCardIndex, UnsupportedQueryError, parse_query
+from tests.cards import card_json
+
+
+@pytest.fixture(scope='module')
+def index() -> LocalCardIndex:
+    return LocalCardIndex([
+        card_json(name='Mabel', expansion='blb', number=1, type_line='Legendary Creature — Mouse Warrior',
+                  rarity='rare', released_at='2024-08-02'),
+        card_json(name='Brambleguard', expansion='blb', number=150, type_line='Creature — Raccoon',
+                  rarity='uncommon', released_at='2024-08-02'),
+        card_json(name='Season of Gathering', expansion='blb', number=270, type_line='Sorcery',
+                  rarity='mythic', released_at='2024-08-02'),
+        card_json(name='Mabel', expansion='blb', number='1p', type_line='Legendary Creature — Mouse Warrior',
+                  rarity='rare', released_at='2024-08-02'),
+        card_json(name='Lightning Bolt', expansion='spg', number=5, type_line='Instant', rarity='mythic',
+                  released_at='2024-08-02', reprint=True),
+        card_json(name='Counterspell', expansion='spg', number=6, type_line='Instant', rarity='mythic',
+                  released_at='2024-04-19', reprint=True),
+        card_json(name='Fable of the Mirror-Breaker // Reflection of Kiki-Jiki', expansion='otj', number=10,
+                  type_line='Enchantment — Saga', rarity='rare', released_at='2024-04-19', games=['paper']),
+    ])
+
+
+def names(cards) -> list[str]:
+    return [card.full_name for card in cards.values()]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('set:blb unique:cards cn<=261', ['Mabel', 'Brambleguard']),
+    ('set:blb cn>150', ['Season of Gathering']),
+    ('set:blb cn<150', ['Mabel']),
+    ('(set:spg and date=blb) unique:cards', ['Lightning Bolt']),
+    ('set:spg date<blb', ['Counterspell']),
+    ('set:blb t:legendary t:creature', ['Mabel']),
+    ('t:mouse or t:raccoon', ['Mabel', 'Brambleguard']),
+    ('set:spg -is:reprint', []),
+    ('set:blb -(t:creature)', ['Season of Gathering']),
+    ('set:blb r>=rare', ['Mabel', 'Season of Gathering']),
+    ('r:m', ['Season of Gathering', 'Lightning Bolt', 'Counterspell']),
+    ('name="Reflection of Kiki-Jiki"', ['Fable of the Mirror-Breaker // Reflection of Kiki-Jiki']),
+    ('bolt', ['Lightning Bolt']),
+    ('set:otj -game:arena', ['Fable of the Mirror-Breaker // Reflection of Kiki-Jiki']),
+    ('date>=2024-08-01 t:instant', ['Lightning Bolt']),
+])
+def test_search(index, query, expected):
+    assert sorted(names(index.search(query))) == sorted(expected)
+
+
+def test_results_are_in_set_and_collector_number_order(index):
+    assert names(index.search('t:creature or t:instant or t:sorcery')) == [
+        'Mabel', 'Brambleguard', 'Season of Gathering', 'Lightning Bolt', 'Counterspell'
+    ]
+
+
+def test_unique_cards_keeps_the_first_printing(index):
+    cards = index.search('name=Mabel')
+    assert list(cards) == ['Mabel']
+    assert cards['Mabel'].number == '1'
+
+
+def test_unique_prints_keeps_every_printing(index):
+    cards = index.search('name=Mabel unique:prints')
+    assert sorted(card.number for card in cards.values()) == ['1', '1p']
+    assert set(cards) == {card.scryfall_id for card in cards.values()}
+
+
+def test_indexes_agree_with_a_full_scan(index):
+    for query in ['set:blb cn<=150', 't:creature', 'date=blb', 'set:spg or t:saga']:
+        parsed = parse_query(query)
+        scanned = {record.seq for record in index.records if parsed.expression.matches(record, index)}
+        candidates = parsed.expression.candidates(index)
+        assert candidates is None or scanned <= candidates
+        assert {card.scryfall_id for card in index.search(query).values()} <= \
+               {index.records[seq].card.scryfall_id for seq in scanned}
+
+
+@pytest.mark.parametrize('query', [
+    'set:xyz',
+    'date=xyz',
+    'o:flying',
+    'unique:art',
+    'is:commander',
+    '(set:blb',
+    'set:blb)',
+    'set>blb',
+    'cn<=12a',
+    'r:ultra',
+])
+def test_unsupported_queries_raise(index, query):
+    with pytest.raises(UnsupportedQueryError):
+        index.search(query)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('t:ape', ['Ape']),
+    ('t:shapeshifter', ['Changeling']),
+    ('t:"mouse warrior"', ['Mabel']),
+    ('t:war', []),
+])
+def test_types_match_whole_words(query, expected):
+    index = LocalCardIndex([
+        card_json(name='Ape', expansion='mh3', type_line='Creature — Ape'),
+        card_json(name='Changeling', expansion='mh3', type_line='Creature — Shapeshifter'),
+        card_json(name='Mabel', expansion='mh3', type_line='Legendary Creature — Mouse Warrior'),
+    ])
+    assert sorted(names(index.search(query))) == sorted(expected)
+
+
+@pytest.mark.parametrize('query', ['date=2024', 'date>=2024-08', 'date=2024-13-01'])
+def test_partial_or_invalid_dates_are_unsupported(index, query):
+    with pytest.raises(UnsupportedQueryError):
+        index.search(query)
+
+
+def test_dates_compare_as_dates(index):
+    assert sorted(names(index.search('date<2024-08-02'))) == \
+           ['Counterspell', 'Fable of the Mirror-Breaker // Reflection of Kiki-Jiki']
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+
+from core.data.scryfall import AsyncScryfall, Scryfall, ScryfallError
+from core.data.sessions import SCRYFALL_SESSION
+from tests.cards import card_json
+
+
+def response(data, status: int = 200):
+    return SimpleNamespace(ok=status < 400, status_code=status, reason='', json=lambda: data, text='')
+
+
+def test_collection_lines_cards_up_with_identifiers(monkeypatch):
+    identifiers = [
+        {'set': 'dmu', 'name': 'Fable of the Mirror Breaker'},
+        {'set': 'dmu', 'name': 'Not A Card'},
+        {'set': 'dmu', 'name': 'Llanowar Elves'},
+    ]
+    found = [
+        card_json('Fable of the Mirror-Breaker // Reflection of Kiki-Jiki', expansion='dmu'),
+        card_json('Llanowar Elves', expansion='dmu'),
+    ]
+    not_found = [{'set': 'DMU', 'name': 'Not A Card'}]
+    monkeypatch.setattr(SCRYFALL_SESSION, 'post', lambda url, json: response({'data': found, 'not_found': not_found}))
+
+    cards = Scryfall.scryfall_collection(identifiers)
+
+    assert [card and card.name for card in cards] == [
+        'Fable of the Mirror-Breaker // Reflection of Kiki-Jiki', None, 'Llanowar Elves'
+    ]
+
+
+def test_collection_falls_back_to_single_lookups_when_unmatched(monkeypatch):
+    identifiers = [{'set': 'dmu', 'name': 'Llanowar Elves'}, {'set': 'dmu', 'name': 'Shivan Dragon'}]
+    monkeypatch.setattr(SCRYFALL_SESSION, 'post', lambda url, json: response({'data': [], 'not_found': []}))
+    looked_up = list()
+    monkeypatch.setattr(Scryfall, '_identifier_card', classmethod(lambda cls, identifier: looked_up.append(identifier)))
+
+    assert Scryfall.scryfall_collection(identifiers) == [None, None]
+    assert looked_up == identifiers
+
+
+def search_pages(monkeypatch, second_page: dict) -> None:
+    """Serves a two page search, with the given second page."""
+    first_page = {'object': 'list', 'has_more': True, 'total_cards': 4, 'data': [card_json('A'), card_json('B')]}
+
+    async def request(cls, url):
+        return second_page if url.endswith('&page=2') else first_page
+    monkeypatch.setattr(AsyncScryfall, 'request', classmethod(request))
+
+
+def test_async_search_merges_every_page(monkeypatch):
+    search_pages(monkeypatch, {'object': 'list', 'has_more': False, 'data': [card_json('C'), card_json('D')]})
+    assert list(asyncio.run(AsyncScryfall.scryfall_search('e%3Ablb'))) == ['A', 'B', 'C', 'D']
+
+
+def test_async_search_raises_on_a_failed_page(monkeypatch):
+    search_pages(monkeypatch, {'object': 'error', 'status': 429, 'details': 'Too Many Requests'})
+    with pytest.raises(ScryfallError):
+        asyncio.run(AsyncScryfall.scryfall_search('e%3Ablb'))
+
+
+def test_search_without_results_is_empty(monkeypatch):
+    error = {'object': 'error', 'status': 404, 'code': 'not_found', 'details': 'Your query didn’t match any cards.'}
+    monkeypatch.setattr(Scryfall, 'request', classmethod(lambda cls, url: error))
+    assert Scryfall.scryfall_search('e%3Axyz') == dict()
@@ -0,0 +1,115 @@
+import os
+import struct
+
+import pytest
+
+from core.data import snapshot
+from core.data.caching import CardCache
+from core.data.set_context import SetContext
+from core.data.snapshot import SnapshotMismatchError, read_snapshot
+from core.game_concepts.card import Card
+from tests.cards import card_json
+
+QUERIES = ('set:blb unique:cards', 'set:spg')
+
+
+def make_set_context() -> SetContext:
+    card_cache = CardCache()
+    for i, rarity in enumerate(['common', 'uncommon', 'rare', 'mythic'] * 3):
+        card_cache._add_to_cache(Card(card_json(name=f'Card {i}', rarity=rarity, back_name='Back' if i == 5 else None)))
+    card_cache._add_to_cache(Card(card_json(name='Quest', expansion='spg', rarity='mythic')))
+    return SetContext('BLB', None, card_cache, queries=QUERIES)
+
+
+@pytest.fixture
+def saved(tmp_path) -> tuple[SetContext, str]:
+    set_context = make_set_context()
+    return set_context, set_context.save_snapshot(str(tmp_path / 'BLB.snapshot'))
+
+
+def test_round_trip(saved):
+    set_context, path = saved
+    loaded = SetContext.from_snapshot(path, 'BLB', None, *QUERIES)
+
+    assert [card.scryfall_id for card in loaded.card_cache.card_list()] == \
+           [card.scryfall_id for card in set_context.card_cache.card_list()]
+    assert [card.scryfall_id for card in loaded.sorted_card_list] == \
+           [card.scryfall_id for card in set_context.sorted_card_list]
+    # The ordered lists refer to the same card objects as the cache, rather than copies.
+    assert all(loaded.card_cache.get_card_data(card.full_name) is card for card in loaded.sorted_card_list)
+
+
+@pytest.mark.parametrize('set_code, bonus_set_code, queries', [
+    ('OTJ', None, QUERIES),
+    ('BLB', 'SPG', QUERIES),
+    ('BLB', None, QUERIES[:1]),
+])
+def test_different_inputs_are_rejected(saved, set_code, bonus_set_code, queries):
+    _, path = saved
+    with pytest.raises(SnapshotMismatchError):
+        SetContext.from_snapshot(path, set_code, bonus_set_code, *queries)
+
+
+def test_old_snapshots_are_rejected(saved):
+    _, path = saved
+    with pytest.raises(SnapshotMismatchError):
+        SetContext.from_snapshot(path, 'BLB', None, *QUERIES, max_age=-1)
+
+
+def test_other_versions_are_rejected(saved):
+    _, path = saved
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(struct.pack('<H', snapshot.SNAPSHOT_VERSION - 1))
+    with pytest.raises(SnapshotMismatchError, match='version'):
+        read_snapshot(path)
+
+
+def test_other_card_layouts_are_rejected_before_unpickling(saved, monkeypatch):
+    _, path = saved
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_LAYOUT', b'\0' * 8)
+    monkeypatch.setattr(snapshot.pickle, 'loads', lambda data: pytest.fail("The payload was unpickled"))
+    with pytest.raises(SnapshotMismatchError, match='layout'):
+        read_snapshot(path)
+
+
+def test_cards_with_a_removed_slot_are_rejected(tmp_path, monkeypatch):
+    # A snapshot written before a slot was removed from `Card`, as if the layout check were bypassed.
+    original_getstate = Card.__getstate__
+    monkeypatch.setattr(Card, '__getstate__', lambda card: {**original_getstate(card), 'removed_slot': 1})
+    path = make_set_context().save_snapshot(str(tmp_path / 'BLB.snapshot'))
+    monkeypatch.setattr(Card, '__getstate__', original_getstate)
+
+    with pytest.raises(SnapshotMismatchError, match='corrupt'):
+        read_snapshot(path)
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: data[:len(data) // 2],
+    lambda data: data[:10],
+    lambda data: data[:30] + b'\xff' * (len(data) - 30),
+    lambda data: b'',
+    lambda data: b'not a snapshot at all',
+])
+def test_corrupt_files_are_rejected(saved, corrupt):
+    _, path = saved
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(corrupt(data))
+    with pytest.raises(SnapshotMismatchError):
+        read_snapshot(path)
+
+
+def test_unusable_snapshots_are_rebuilt(saved, monkeypatch):
+    _, path = saved
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 20)
+
+    rebuilt = make_set_context()
+    monkeypatch.setattr(SetContext, 'from_queries', classmethod(lambda cls, *args, **kwargs: rebuilt))
+    loaded = SetContext.from_snapshot_or_queries('BLB', None, *QUERIES, path=path)
+
+    assert loaded is rebuilt
+    # The rebuilt context replaces the unusable snapshot.
+    assert len(SetContext.from_snapshot(path, 'BLB', None, *QUERIES).card_cache) == len(rebuilt.card_cache)